@@ -0,0 +1,184 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from langchain_core.embeddings import Embeddings
+
+# --- PERSISTENT EMBEDDING CACHE ---
+# SQLite table keyed by (embedding model, sha256 of the text). Wrapping the
+# embedder means re-ingesting with a different chunk size, re-running ingest,
+# or asking the same question twice never pays for the same vector again.
+# Works for both OpenAIEmbeddings and HuggingFaceEmbeddings.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "data", "embedding_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 500_000
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def model_key(embeddings):
+    # e.g. "OpenAIEmbeddings:text-embedding-ada-002" or
+    # "HuggingFaceEmbeddings:sentence-transformers/all-MiniLM-L6-v2"
+    name = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or "default"
+    key = f"{type(embeddings).__name__}:{name}"
+    dims = getattr(embeddings, "dimensions", None)
+    return f"{key}:{dims}" if dims else key
+
+
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        # Returns {hash: vector} for the hashes we already have
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model, items):
+        # items: iterable of (hash, vector)
+        now = time.time()
+        rows = [(model, h, array("f", vec).tobytes(), now) for h, vec in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        # LRU: once over the cap, trim back to 90% so we don't evict on every insert
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+        self.evictions += excess
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_mb": round(os.path.getsize(self.path) / 1e6, 2) if os.path.exists(self.path) else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    # Drop-in wrapper: pass it anywhere an Embeddings object is expected
+    def __init__(self, embeddings, cache=None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model = model_key(embeddings)
+        self.query_model = self.model + ":query"
+
+    def _split(self, texts, model=None):
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(model or self.model, hashes)
+        # Embed each missing text once, even if it appears several times in the batch
+        missing = {}
+        for t, h in zip(texts, hashes):
+            if h not in found and h not in missing:
+                missing[h] = t
+        return hashes, found, missing
+
+    def _merge(self, hashes, found, missing, vectors, model=None):
+        new = list(zip(missing.keys(), vectors))
+        self.cache.put_many(model or self.model, new)
+        found.update(new)
+        return [found[h] for h in hashes]
+
+    def embed_documents(self, texts):
+        hashes, found, missing = self._split(texts)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._merge(hashes, found, missing, vectors)
+
+    def embed_query(self, text):
+        # Queries get their own namespace: some models embed queries differently
+        h = text_hash(text)
+        found = self.cache.get_many(self.query_model, [h])
+        if h in found:
+            return found[h]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.query_model, [(h, vector)])
+        return vector
+
+    def embed_queries(self, texts):
+        # Several queries in one round-trip (multi-query retrieval). The
+        # models we use (OpenAI, all-MiniLM-L6-v2) embed queries and
+        # documents identically, so the misses go out as one batch.
+        hashes, found, missing = self._split(texts, self.query_model)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._merge(hashes, found, missing, vectors, self.query_model)
+
+    async def aembed_documents(self, texts):
+        hashes, found, missing = self._split(texts)
+        vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return self._merge(hashes, found, missing, vectors)
+
+    async def aembed_query(self, text):
+        h = text_hash(text)
+        found = self.cache.get_many(self.query_model, [h])
+        if h in found:
+            return found[h]
+        vector = await self.embeddings.aembed_query(text)
+        self.cache.put_many(self.query_model, [(h, vector)])
+        return vector
@@ -1,10 +1,13 @@
 import sys
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
+from embedding_cache import CachedEmbeddings
+from llm_cache import make_llm_cache
 
 load_dotenv()
 
@@ -13,20 +16,25 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
 
 # --- CONFIGURATION ---
-print("🧠 Loading Local Models...")
+# Loaded lazily (once per process) so importing this module doesn't pay for
+# the HuggingFace model load
+@lru_cache(maxsize=1)
+def get_components():
+    print("🧠 Loading Local Models...")
 
-# 1. Embeddings (Must match Ingest)
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    # 1. Embeddings (Must match Ingest)
+    embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
 
-# 2. Vector Store (FIXED: Added collection_name)
-vector_store = Chroma(
-    collection_name="rag_collection",  # <--- THIS WAS MISSING
-    persist_directory=DB_PATH, 
-    embedding_function=embeddings
-)
+    # 2. Vector Store (FIXED: Added collection_name)
+    vector_store = Chroma(
+        collection_name="rag_collection",  # <--- THIS WAS MISSING
+        persist_directory=DB_PATH,
+        embedding_function=embeddings
+    )
 
-# 3. LLM (Ollama)
-llm = ChatOllama(model="llama3.2", temperature=0) 
+    # 3. LLM (Ollama)
+    llm = ChatOllama(model="llama3.2", temperature=0, cache=make_llm_cache())
+    return vector_store, llm
 
 # --- PROMPT ---
 prompt = ChatPromptTemplate.from_template("""
@@ -42,6 +50,7 @@ Question:
 """)
 
 def chat():
+    vector_store, llm = get_components()
     print("\n🚀 Local RAG System (Ollama Mode) Ready!")
     print(f"📂 Connected to DB at: {DB_PATH}")
     print("Type 'exit' to quit.\n")
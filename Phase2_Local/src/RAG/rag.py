@@ -5,8 +5,10 @@ from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from embedding_cache import CachedEmbeddings
+from llm_cache import make_llm_cache
+from vector_index import make_retriever
 
 load_dotenv()
 
@@ -19,7 +21,7 @@ class LocalRAGSystem:
         
         # 1. Embeddings
         print("   -> [1/3] Loading Embeddings...")
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
         
         # 2. ChromaDB (FIXED: Added collection_name)
         print(f"   -> [2/3] Connecting to Database at {DB_PATH}...")
@@ -28,12 +30,13 @@ class LocalRAGSystem:
             persist_directory=DB_PATH,
             embedding_function=self.embeddings
         )
-        self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+        # Chroma or FAISS, depending on RAG_VECTOR_BACKEND (see vector_index.py)
+        self.retriever = make_retriever(self.embeddings, 5, vector_store=self.vector_store)
         print("      ✅ Connected.")
         
-        # 3. Ollama
+        # 3. Ollama (one client, so every query - sync or async - shares its connection pool)
         print("   -> [3/3] Connecting to Ollama (Llama 3.2)...")
-        self.llm = ChatOllama(model="llama3.2", temperature=0)
+        self.llm = ChatOllama(model="llama3.2", temperature=0, cache=make_llm_cache())
 
         # 4. Prompt
         self.prompt = ChatPromptTemplate.from_template("""
@@ -48,24 +51,31 @@ class LocalRAGSystem:
         {question}
         """)
         
-        # 5. Chain
-        self.chain = (
-            {"context": self.retriever, "question": RunnablePassthrough()}
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        # 5. Chain (retrieval happens once, in query()/aquery(), not inside the chain)
+        self.chain = self.prompt | self.llm | StrOutputParser()
 
-    def query(self, question):
+    def _log_docs(self, question, docs):
         print(f"\n🔎 Searching for: '{question}'...")
-        # Debug: Print first 50 chars of retrieved docs to prove it found something
-        docs = self.retriever.invoke(question)
         if not docs:
             print("   ⚠️ WARNING: No documents found! DB might be empty.")
         else:
             print(f"   ✅ Found {len(docs)} relevant chunks.")
-            
-        return self.chain.invoke(question)
+
+    def _context(self, docs):
+        return "\n\n".join(doc.page_content for doc in docs)
+
+    def query(self, question):
+        docs = self.retriever.invoke(question)
+        self._log_docs(question, docs)
+        return self.chain.invoke({"context": self._context(docs), "question": question})
+
+    async def aquery(self, question):
+        # Same as query(), awaitable: many questions can be in flight at once
+        # (asyncio.gather). The local vector search runs in a worker thread,
+        # generation is awaited on Ollama's async client.
+        docs = await self.retriever.ainvoke(question)
+        self._log_docs(question, docs)
+        return await self.chain.ainvoke({"context": self._context(docs), "question": question})
 
 if __name__ == "__main__":
     rag = LocalRAGSystem()
@@ -10,6 +10,12 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from embedding_cache import CachedEmbeddings
+from llm_cache import make_llm_cache
+from answer_parser import AnswerParser
+from vector_index import make_retriever
+
 load_dotenv()
 
 # --- 1. PATH SETUP ---
@@ -30,11 +36,11 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 # --- 2. CONFIGURATION (LOCAL) ---
 # CHANGED: Use the same embeddings as ingest.py
 print("🧠 Loading Local Embeddings (HuggingFace)...")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
 
 # CHANGED: Use Local LLM (Ollama)
 print("🦙 Connecting to Ollama (Llama 3.2)...")
-llm = ChatOllama(model="llama3.2", temperature=0)
+llm = ChatOllama(model="llama3.2", temperature=0, cache=make_llm_cache())
 
 # Connect to DB (FIXED: Added collection_name)
 vector_store = Chroma(
@@ -68,12 +74,12 @@ def build_citation_map(manifest_path):
 
 # Load Citation Map
 CITATION_MAP = build_citation_map(MANIFEST_PATH)
+# Reads Llama's {"answer", "source_files"} output, tolerating fences and broken JSON
+answer_parser = AnswerParser(CITATION_MAP)
 
 # Setup Retriever
-retriever = vector_store.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 5, "fetch_k": 20, "lambda_mult": 0.5}
-)
+retriever = make_retriever(embeddings, 5, search_type="mmr", vector_store=vector_store,
+                           fetch_k=20, lambda_mult=0.5)
 
 # Prompt (Optimized for Llama 3 JSON)
 PROMPT_TEMPLATE = """
@@ -129,24 +135,12 @@ def run_query(question):
     
     try:
         response = chain.invoke({"context": context_text, "question": question})
-        # Clean cleanup for Llama 3
-        clean_content = response.content.strip()
-        if clean_content.startswith("```json"):
-            clean_content = clean_content[7:]
-        if clean_content.endswith("```"):
-            clean_content = clean_content[:-3]
-            
-        data = json.loads(clean_content)
-        answer_text = data.get("answer", "No answer found")
-        
-        # Map filenames to Citations
-        raw_files = data.get("source_files", [])
-        citations = [CITATION_MAP.get(f, f) for f in raw_files]
-        
-    except json.JSONDecodeError:
-        # Fallback if Llama returns plain text
-        answer_text = response.content
-        citations = [CITATION_MAP.get(f, f) for f in list(found_files)]
+        parsed = answer_parser.parse(response.content)
+        answer_text = parsed["answer"]
+        citations = parsed["citations_readable"]
+        if parsed["status"] == "plain":
+            # Fallback if Llama returns plain text: cite what was retrieved
+            citations = [CITATION_MAP.get(f, f) for f in list(found_files)]
     except Exception as e:
         answer_text = f"Error: {e}"
 
@@ -226,6 +220,10 @@ if __name__ == "__main__":
     with open(LOGS_PATH, "w") as f:
         json.dump(full_results, f, indent=2)
         
+    print(f"\n🧊 Embedding cache: {embeddings.cache.stats()}")
+    if llm.cache:
+        print(f"🧊 LLM cache: {llm.cache.stats()}")
+    print(f"🧾 Answer parsing: {answer_parser.stats()}")
     print(f"\n✅ Evaluation Complete.")
     print(f"📄 Clean Report: {SUMMARY_PATH}")
     print(f"🪵  Detailed Logs: {LOGS_PATH}")
\ No newline at end of file
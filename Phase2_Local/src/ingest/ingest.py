@@ -1,11 +1,21 @@
 import os
-import shutil
+import sys
+import argparse
+import pandas as pd
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 
+from ingest_state import (
+    file_sha256, manifest_row_to_dict, load_state, save_state,
+    plan_changes, chunk_ids, delete_chunks,
+)
+from pdf_loader import load_pdfs_parallel
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from embedding_cache import CachedEmbeddings
+
 load_dotenv()
 
 # --- PATH SETUP ---
@@ -14,63 +24,140 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 # CHANGED: Pointing to "data/raw" instead of "data/pdfs"
 DATA_PATH = os.path.join(BASE_DIR, "data", "raw")
 DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
+MANIFEST_PATH = os.path.join(BASE_DIR, "data", "data_manifest.csv")
+STATE_PATH = os.path.join(BASE_DIR, "data", "ingest_state.json")
+
+def load_manifest_rows():
+    # Optional: the local build works off the directory listing, but if the
+    # manifest is present we record each file's row so metadata edits re-ingest too
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        df = pd.read_csv(MANIFEST_PATH)
+        return {str(row['filename']).strip(): row for _, row in df.iterrows()}
+    except Exception as e:
+        print(f"⚠️ Manifest Error: {e}")
+        return {}
+
+def pdf_job(fname, row):
+    # Manifest metadata (when the file has a row) is attached to every single
+    # page inside the worker, same fields as the main pipeline
+    metadata = {'filename': fname}
+    if row is not None:
+        metadata.update({
+            'source_id': row['source_id'],
+            'citation': row['citation'], # e.g. "(Smith, 2023)"
+            'title': row['title'],
+        })
+    return fname, os.path.join(DATA_PATH, fname), metadata
 
-def create_vector_db():
+def create_vector_db(full_rebuild=False, workers=None):
     print(f"🚀 Starting Local Ingestion...")
     print(f"📂 Looking for PDFs in: {DATA_PATH}")
 
-    # 1. Load Data
+    # 1. Scan Data
     # Check if directory exists first
     if not os.path.exists(DATA_PATH):
         print(f"❌ ERROR: The directory '{DATA_PATH}' does not exist.")
         return
 
-    loader = PyPDFDirectoryLoader(DATA_PATH)
-    documents = loader.load()
-    
-    if not documents:
+    pdf_files = sorted(f for f in os.listdir(DATA_PATH) if f.lower().endswith(".pdf"))
+    if not pdf_files:
         print(f"❌ ERROR: No PDFs found in '{DATA_PATH}'!")
         return
-        
-    print(f"   -> Loaded {len(documents)} pages.")
 
-    # 2. Split Data (Chunking)
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100
-    )
-    chunks = text_splitter.split_documents(documents)
-    print(f"   -> Split into {len(chunks)} chunks.")
+    manifest_rows = load_manifest_rows()
+    current = {}
+    for fname in pdf_files:
+        row = manifest_rows.get(fname)
+        current[fname] = {
+            "filename": fname,
+            "sha256": file_sha256(os.path.join(DATA_PATH, fname)),
+            "manifest": manifest_row_to_dict(row) if row is not None else {},
+        }
 
-    # 3. Initialize Local Embeddings
+    # 2. Initialize Local Embeddings
     print("🧠 Loading HuggingFace Embeddings (all-MiniLM-L6-v2)...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    # 4. Reset DB
-    if os.path.exists(DB_PATH):
-        print("🗑️  Deleting old database...")
-        shutil.rmtree(DB_PATH)
+    embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
 
-    # 5. Create Vector Store (Batch Processing)
-    print(f"💾 Saving to ChromaDB at {DB_PATH}...")
-    
     # Initialize Chroma
     vector_store = Chroma(
         collection_name="rag_collection",
         embedding_function=embeddings,
         persist_directory=DB_PATH
     )
-    
-    # Add in batches to prevent memory issues
+
+    # 3. Reset DB (only when explicitly asked for)
+    if full_rebuild:
+        print("🗑️  Full rebuild requested. Dropping old collection...")
+        vector_store.delete_collection()
+        vector_store = Chroma(
+            collection_name="rag_collection",
+            embedding_function=embeddings,
+            persist_directory=DB_PATH
+        )
+        state = {}
+    else:
+        state = load_state(STATE_PATH)
+
+    added, changed, removed = plan_changes(state, current)
+    print(f"   -> {len(added)} new, {len(changed)} changed, {len(removed)} removed, "
+          f"{len(current) - len(added) - len(changed)} unchanged.")
+
+    # 4. Remove chunks of deleted PDFs
+    for fname in removed:
+        deleted = delete_chunks(vector_store, "filename", fname)
+        state.pop(fname, None)
+        save_state(STATE_PATH, state)
+        print(f"   🗑️  Removed {fname} ({deleted} chunks)")
+
+    # 5. Split Data (Chunking)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=100
+    )
+
+    # 6. Parse new / edited PDFs in parallel, then add them (Batch Processing)
+    print(f"💾 Saving to ChromaDB at {DB_PATH}...")
     batch_size = 100
-    total_chunks = len(chunks)
-    
-    for i in range(0, total_chunks, batch_size):
-        batch = chunks[i:i + batch_size]
-        print(f"   Processing batch {i}/{total_chunks}...")
-        vector_store.add_documents(documents=batch)
+    total_chunks = 0
+    failed = []
+    jobs = [pdf_job(fname, manifest_rows.get(fname)) for fname in added + changed]
+
+    for fname, documents, error in load_pdfs_parallel(jobs, max_workers=workers):
+        file_path = os.path.join(DATA_PATH, fname)
+        entry = current[fname]
+        if error:
+            print(f"   ❌ Failed to load {fname}: {error}")
+            failed.append(fname)
+            continue
+
+        chunks = text_splitter.split_documents(documents)
+        ids = chunk_ids(fname, entry["sha256"], len(chunks))
+
+        # Clear stale chunks (older version, or a build from before incremental mode)
+        delete_chunks(vector_store, "filename", fname)
+        delete_chunks(vector_store, "source", file_path)
+
+        # Add in batches to prevent memory issues
+        for i in range(0, len(chunks), batch_size):
+            vector_store.add_documents(documents=chunks[i:i + batch_size], ids=ids[i:i + batch_size])
+
+        state[fname] = entry
+        save_state(STATE_PATH, state)
+        total_chunks += len(chunks)
+        print(f"   ✅ {fname}: {len(chunks)} chunks")
 
-    print("✅ Local Database Built Successfully!")
+    if failed:
+        print(f"⚠️ {len(failed)} file(s) failed to parse and will be retried next run: {', '.join(failed)}")
+    print(f"🧊 Embedding cache: {embeddings.cache.stats()}")
+    print(f"✅ Local Database Updated Successfully! ({total_chunks} chunks embedded)")
 
 if __name__ == "__main__":
-    create_vector_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the local ChromaDB from data/raw.")
+    parser.add_argument("--full", action="store_true",
+                        help="Drop the collection and re-embed every PDF from scratch.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="PDF parsing processes (default: one per CPU, 1 = no pool).")
+    args = parser.parse_args()
+    create_vector_db(full_rebuild=args.full, workers=args.workers)
@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+
+# --- INCREMENTAL INGESTION STATE ---
+# Remembers which PDF (by content hash) and which manifest row produced the
+# chunks currently sitting in Chroma, so a re-run only touches what changed.
+#
+# State file layout (JSON):
+# {
+#   "<key>": {"filename": "...pdf", "sha256": "...", "manifest": {...}},
+#   ...
+# }
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_row_to_dict(row):
+    # Stringify so pandas NaN / int64 compare cleanly against the JSON copy
+    return {str(k): str(v) for k, v in row.items()}
+
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Warning: Could not read ingest state ({e}). Treating every file as new.")
+        return {}
+
+
+def save_state(state_path, state):
+    # Write-then-rename so a crash mid-write never leaves a corrupt state file
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def plan_changes(state, current):
+    # Returns (added, changed, removed) keys, each in a stable order
+    added = sorted(k for k in current if k not in state)
+    changed = sorted(k for k in current if k in state and state[k] != current[k])
+    removed = sorted(k for k in state if k not in current)
+    return added, changed, removed
+
+
+def chunk_ids(key, sha256, count):
+    # Deterministic ids: re-adding the same file version overwrites, never duplicates
+    return [f"{key}:{sha256[:12]}:{i:05d}" for i in range(count)]
+
+
+def delete_chunks(vector_store, field, value, keep_ids=None):
+    # keep_ids lets a resumed run hold on to batches it already committed
+    existing = vector_store.get(where={field: value}, include=[])
+    ids = [i for i in existing.get("ids", []) if not keep_ids or i not in keep_ids]
+    if ids:
+        vector_store.delete(ids=ids)
+    return len(ids)
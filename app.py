@@ -7,17 +7,35 @@ import sys
 
 # --- IMPORT YOUR EXISTING PHASE 2 LOGIC ---
 sys.path.append(os.path.abspath("src/eval"))
-from eval import run_query
+sys.path.append(os.path.abspath("src/RAG"))
+from citations import load_citation_table
+from service import get_service
 
 st.set_page_config(page_title="Personal Research Portal", page_icon="🌍", layout="wide")
 
 if 'history' not in st.session_state:
     st.session_state.history = []
 
+# Per-paper table written at ingest time (cheap: one row per paper, no chunk scan)
+@st.cache_data
+def load_corpus_table():
+    return load_citation_table(os.path.join("data", "citations.json"), os.path.join("data", "data_manifest.csv"))
+
+corpus_table = load_corpus_table()
+
+# One RAG service per process, shared by every browser session. Nothing heavy
+# is built until the first question comes in.
+@st.cache_resource(show_spinner="🧠 Warming up the research engine...")
+def load_rag_service():
+    service = get_service()
+    service.warm_up()
+    return service
+
 # --- SIDEBAR ---
 with st.sidebar:
     st.title("🌍 Research Portal")
     st.markdown("**Domain:** African Languages & Low-Resource NLP")
+    st.caption(f"📚 {len(corpus_table)} papers indexed")
     st.markdown("---")
     page = st.radio("Navigation", [
         "🔍 Search & Synthesize", 
@@ -45,16 +63,43 @@ if page == "🔍 Search & Synthesize":
             with st.status("🧠 Consulting the Research Corpus...", expanded=True) as status:
                 st.write("🔍 Vectorizing query...")
                 st.write("📚 Searching ChromaDB...")
-                result = run_query(query)
-                status.update(label="✅ Synthesis Complete!", state="complete", expanded=False)
-            
+                events = load_rag_service().stream_query(query)
+                # The first event arrives once retrieval is done; tokens follow
+                event = next(events)
+                if event["type"] == "sources":
+                    st.write(f"🧾 {len(event['chunks'])} evidence chunks selected")
+                status.update(label="✅ Evidence Retrieved!", state="complete", expanded=False)
+
+            # --- STREAMED ANSWER ---
+            placeholder = st.empty()
+            streamed = ""
+            result = event.get("result")
+            for event in events:
+                if event["type"] == "token":
+                    streamed += event["text"]
+                    placeholder.markdown(streamed + "▌")
+                elif event["type"] == "done":
+                    result = event["result"]
+            placeholder.empty()
+
+            cache_info = result.get("cache", {})
+            if cache_info.get("hit"):
+                st.caption(f"⚡ Reused the answer to a similar question: \"{cache_info['matched_question']}\"")
+
             # --- TRUST BEHAVIOR: MISSING EVIDENCE HANDLING ---
-            if "Insufficient" in result["answer"] or "Error" in result["answer"]:
+            # The service flags it, whether the confidence gate or the LLM decided
+            insufficient = result.get("insufficient_evidence", False)
+            if insufficient or result["answer"].startswith("Error:"):
                 st.warning("⚠️ **Missing Evidence Detected:** The corpus does not contain enough information to fully answer this.")
+                gate = result.get("gate") or {}
+                if gate.get("passed") is False and gate["features"].get("missing_terms"):
+                    st.caption(f"🚧 Not found in any paper: {', '.join(gate['features']['missing_terms'])}")
                 st.info("💡 **Suggested Next Retrieval Step:** Try broadening your keywords, or check the `data_manifest.csv` to ensure papers on this specific topic are ingested.")
             else:
                 st.markdown("### 📝 Synthesized Answer")
                 st.success(result["answer"])
+            if result.get("ttft") is not None:
+                st.caption(f"⏱️ First token {result['ttft']}s · total {result['time_taken']}s")
             
             st.divider()
             
@@ -91,6 +136,7 @@ if page == "🔍 Search & Synthesize":
                 "answer": result["answer"],
                 "citations": result.get("citations_readable", []),
                 "chunks": result["retrieved_chunks"],
+                "insufficient_evidence": insufficient,
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             })
 
@@ -122,7 +168,7 @@ elif page == "📊 Export Artifacts":
             st.markdown("### Evidence Table")
             artifact_data = []
             for item in st.session_state.history:
-                if "Insufficient" in item['answer']:
+                if item.get('insufficient_evidence'):
                     continue
                 
                 top_evidence = item['chunks'][0]['text_snippet'] if item['chunks'] else "N/A"
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from array import array
+
+# --- SEMANTIC ANSWER CACHE ---
+# Sits in front of RAGService.run_query. Paraphrases of a question we have
+# already answered ("main findings of AfroBench" / "what did AfroBench find")
+# have near-identical embeddings, so a cosine match above THRESHOLD returns
+# the stored answer, citations and chunks instead of paying for another
+# GPT-4o call.
+#
+# Similarity alone is not enough: "What metrics does AfroBench use?" and
+# "What metrics does IrokoBench use?" embed almost identically. Each entry
+# also stores the papers its question names (PaperMatcher source_ids), and a
+# hit must name exactly the same ones.
+#
+# Entries are tagged with the index version (a hash of ingest_state.json),
+# so answers built from an older corpus are dropped as soon as ingest.py
+# changes it. Eviction is LRU (max_entries) plus a TTL.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "data", "answer_cache.sqlite")
+STATE_PATH = os.path.join(BASE_DIR, "data", "ingest_state.json")
+
+DEFAULT_THRESHOLD = 0.97          # cosine similarity for a hit
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL = 7 * 24 * 3600       # seconds
+
+
+def index_version(state_path=STATE_PATH, extra=""):
+    # Changes whenever ingest adds, edits or removes a paper. `extra` lets the
+    # caller fold in anything else an answer depends on (model, prompt, backend).
+    digest = hashlib.sha256(extra.encode("utf-8"))
+    try:
+        with open(state_path, "rb") as f:
+            digest.update(f.read())
+    except FileNotFoundError:
+        digest.update(b"no-ingest-state")
+    return digest.hexdigest()[:16]
+
+
+def entity_key(entities):
+    # Order-free key for the papers a question names ("" for none)
+    return ",".join(sorted(set(entities or ())))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32")
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class SemanticAnswerCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, version="", threshold=DEFAULT_THRESHOLD,
+                 max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+        self.seconds_saved = 0.0
+        self.lookup_seconds = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                entities TEXT NOT NULL DEFAULT '',
+                result TEXT NOT NULL,
+                cost_seconds REAL NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if "entities" not in columns:
+            # Cache from before entities were recorded: its answers can't be
+            # told apart by paper, so they are dropped rather than trusted
+            self._conn.execute("DELETE FROM answers")
+            self._conn.execute("ALTER TABLE answers ADD COLUMN entities TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_access ON answers(last_access)")
+        self._conn.commit()
+        self.version = None
+        self.set_version(version)
+
+    def set_version(self, version):
+        # Drop every answer built against another index version, then load the
+        # rest into memory as one normalized matrix for the similarity scan
+        with self._lock:
+            if version == self.version:
+                return
+            cursor = self._conn.execute("DELETE FROM answers WHERE version != ?", (version,))
+            self.invalidated += cursor.rowcount
+            self._conn.commit()
+            self.version = version
+            self._expire()
+            self._reload()
+
+    def _reload(self):
+        rows = self._conn.execute("SELECT id, vector, entities FROM answers ORDER BY id").fetchall()
+        self._ids = [row_id for row_id, _, _ in rows]
+        self._entities = np.array([entities for _, _, entities in rows], dtype=object)
+        self._matrix = (np.vstack([_unit(array("f", blob)) for _, blob, _ in rows])
+                        if rows else np.zeros((0, 0), dtype="float32"))
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        cursor = self._conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+        self.evictions += cursor.rowcount
+        self._conn.commit()
+
+    def lookup(self, question_vector, entities=()):
+        # Returns (result, similarity, matched_question) or None. Only entries
+        # naming the same papers (`entities`, source_ids) are candidates.
+        start = time.perf_counter()
+        with self._lock:
+            found = None
+            if self._ids:
+                similarities = self._matrix @ _unit(question_vector)
+                similarities[self._entities != entity_key(entities)] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row = self._conn.execute(
+                        "SELECT question, result, cost_seconds, created FROM answers WHERE id = ?",
+                        (self._ids[best],)
+                    ).fetchone()
+                    if row and (not self.ttl or row[3] >= time.time() - self.ttl):
+                        found = (json.loads(row[1]), round(float(similarities[best]), 4), row[0])
+                        self._conn.execute("UPDATE answers SET last_access = ? WHERE id = ?",
+                                           (time.time(), self._ids[best]))
+                        self._conn.commit()
+                        self.seconds_saved += row[2]
+                    elif row:
+                        self._expire()
+                        self._reload()
+
+            elapsed = time.perf_counter() - start
+            self.lookup_seconds += elapsed
+            if found:
+                self.hits += 1
+                self.seconds_saved -= elapsed
+            else:
+                self.misses += 1
+        return found
+
+    def put(self, question, question_vector, result, cost_seconds, entities=()):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (version, question, vector, entities, result, cost_seconds, created, "
+                "last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.version, question, array("f", question_vector).tobytes(), entity_key(entities),
+                 json.dumps(result), cost_seconds, now, now)
+            )
+            self._conn.commit()
+            self._evict()
+            self._reload()
+
+    def _evict(self):
+        # LRU: once over the cap, trim back to 90% so we don't evict on every insert
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+        self.evictions += excess
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._reload()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "seconds_saved": round(self.seconds_saved, 2),
+            "avg_lookup_ms": round(self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidated": self.invalidated,
+            "entries": len(self._ids),
+            "version": self.version,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,186 @@
+import re
+import json
+from collections import Counter
+
+# --- ANSWER POST-PROCESSING ---
+# Turns a raw completion into (answer, citations) for both prompt schemas:
+# GPT-4o returns {"answer", "citations": [source_ids]}, Llama 3.2 returns
+# {"answer", "source_files": [filenames]}.
+#
+#   * CitationRewriter swaps every [source_xx] marker for its readable
+#     citation in one regex pass with a dict lookup, instead of one
+#     str.replace per known source.
+#   * AnswerParser recovers what it can when the JSON isn't clean: fenced or
+#     chatty output, trailing commas and raw newlines, output cut off
+#     mid-string, or plain text with no JSON at all. Each completion is
+#     tagged with how it was parsed, and the counts are kept so failures show
+#     up in stats() instead of as a lost answer.
+
+CITATION_KEYS = ("citations", "source_files")
+MAX_MARKER_LEN = 100        # longest text between [ and ] we treat as a marker
+
+_MARKER_RE = re.compile(r"\[([^\[\]\n]{1,%d})\]" % MAX_MARKER_LEN)
+_SEPARATOR_RE = re.compile(r"[,;]")
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_ANSWER_KEY_RE = re.compile(r'"answer"\s*:\s*"')
+_IDS_RE = re.compile(r'"(%s)"\s*:\s*\[([^\]]*)' % "|".join(CITATION_KEYS))
+_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_INSUFFICIENT_RE = re.compile(r"\binsufficient evidence\b", re.IGNORECASE)
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# How a completion was parsed, best to worst
+PARSE_STATUSES = ("json", "repaired", "partial", "plain", "empty")
+
+
+def decode_json_string(raw, i):
+    # Decodes a JSON string body starting at raw[i] (just after the opening
+    # quote). Returns (text, position reached, closed). Stops early, without
+    # consuming it, on an escape sequence cut off by the end of raw.
+    out = []
+    while i < len(raw):
+        ch = raw[i]
+        if ch == '"':
+            return "".join(out), i + 1, True
+        if ch != "\\":
+            out.append(ch)
+            i += 1
+            continue
+        if i + 1 >= len(raw):
+            break
+        code = raw[i + 1]
+        if code == "u":
+            if i + 6 > len(raw):
+                break
+            try:
+                out.append(chr(int(raw[i + 2:i + 6], 16)))
+            except ValueError:
+                pass
+            i += 6
+        else:
+            out.append(_ESCAPES.get(code, code))
+            i += 2
+    return "".join(out), i, False
+
+
+class CitationRewriter:
+    def __init__(self, citation_map):
+        self.citation_map = citation_map
+
+    def _bare(self, s_id):
+        # The manifest's citations already carry their brackets: "(Ojo et al., 2025)"
+        citation = self.citation_map[s_id]
+        return citation[1:-1] if citation.startswith("(") and citation.endswith(")") else citation
+
+    def _marker(self, match):
+        # "[source_01]" -> "(Author, 2024)"; "[source_01, source_05]" -> "(A; B)".
+        # Anything that isn't all known ids is left alone.
+        inner = match.group(1)
+        if inner in self.citation_map:
+            return f"({self._bare(inner)})"
+        ids = [part.strip() for part in _SEPARATOR_RE.split(inner)]
+        if all(i in self.citation_map for i in ids):
+            return "(" + "; ".join(self._bare(i) for i in ids) + ")"
+        return match.group(0)
+
+    def rewrite(self, text):
+        return _MARKER_RE.sub(self._marker, text)
+
+    def marker_ids(self, text):
+        # Known ids cited inline, in order of first mention
+        found = []
+        for match in _MARKER_RE.finditer(text):
+            for part in _SEPARATOR_RE.split(match.group(1)):
+                part = part.strip()
+                if part in self.citation_map and part not in found:
+                    found.append(part)
+        return found
+
+    def resolve(self, raw_ids):
+        # Raw ids from the JSON -> readable citations, in order, without repeats
+        readable = []
+        for rid in raw_ids:
+            clean_id = str(rid).replace("[", "").replace("]", "").strip()
+            citation = self.citation_map.get(clean_id, clean_id)
+            if citation and citation not in readable:
+                readable.append(citation)
+        return readable
+
+
+def _load_object(text):
+    # The outermost {...} in the text, parsed strictly, then leniently
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None, None
+    body = text[start:end + 1]
+    try:
+        return json.loads(body), "json"
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", body), strict=False), "repaired"
+    except json.JSONDecodeError:
+        return None, None
+
+
+def extract_answer(raw, citation_keys=CITATION_KEYS):
+    # Returns (answer text, raw citation ids, status). Answer markers are not rewritten here.
+    text = _FENCE_RE.sub("", raw or "").strip()
+    if not text:
+        return "", [], "empty"
+
+    data, status = _load_object(text)
+    if isinstance(data, dict) and "answer" in data:
+        ids = next((data[key] for key in citation_keys if isinstance(data.get(key), list)), [])
+        return str(data["answer"]), [str(i) for i in ids], status
+
+    # Cut off or otherwise broken: pull the fields out one by one
+    match = _ANSWER_KEY_RE.search(text)
+    if match:
+        answer, _, _ = decode_json_string(text, match.end())
+        ids_match = _IDS_RE.search(text)
+        ids = _STRING_RE.findall(ids_match.group(2)) if ids_match else []
+        return answer.strip(), ids, "partial"
+
+    if text.startswith("{"):
+        return "", [], "empty"
+    return text, [], "plain"
+
+
+class AnswerParser:
+    def __init__(self, citation_map, citation_keys=CITATION_KEYS):
+        self.rewriter = CitationRewriter(citation_map)
+        self.citation_keys = citation_keys
+        self.counts = Counter()
+
+    def parse(self, raw):
+        # Returns {"answer", "citations_raw", "citations_readable", "status", "insufficient"}
+        answer, raw_ids, status = extract_answer(raw, self.citation_keys)
+        self.counts[status] += 1
+        if status == "empty":
+            answer = "Error: could not parse an answer from the model output"
+        elif not raw_ids and status != "json":
+            raw_ids = self.rewriter.marker_ids(answer)    # the list was lost; use the inline markers
+        if status != "json":
+            print(f"   ⚠️ Answer parse: {status} ({len(raw or '')} chars of output)")
+        return {
+            "answer": self.rewriter.rewrite(answer),
+            "citations_raw": raw_ids,
+            "citations_readable": self.rewriter.resolve(raw_ids),
+            "status": status,
+            "insufficient": bool(_INSUFFICIENT_RE.search(answer)),
+        }
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return {
+            "parsed": total,
+            **{status: self.counts[status] for status in PARSE_STATUSES},
+            "clean_rate": round(self.counts["json"] / total, 4) if total else 0.0,
+        }
+
+
+def llm_error(exc):
+    # Parsed-answer shape for a call that failed outright (not a parse failure)
+    return {"answer": f"Error: {str(exc)}", "citations_raw": [], "citations_readable": [], "status": "error",
+            "insufficient": False}
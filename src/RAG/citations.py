@@ -0,0 +1,83 @@
+import os
+import json
+import pandas as pd
+
+# --- CITATION SIDECAR ---
+# A compact per-paper table written by ingest.py next to the Chroma directory.
+# Loading it is O(#papers), unlike scanning every chunk's metadata with
+# vector_store.get(), which grows with O(#chunks).
+#
+# data/citations.json:
+# {
+#   "source_02": {"source_id": "source_02", "filename": "...pdf", "title": "...",
+#                 "author": "Ojo et al.", "year": "2025",
+#                 "citation": "(Ojo et al., 2025)", "venue": "AphaXiv"},
+#   ...
+# }
+
+FIELDS = ["source_id", "filename", "title", "author", "year", "citation", "venue"]
+
+# Manifest header -> sidecar field (the CSV headers are hand-edited)
+_ALIASES = {
+    "source_id": ["source_id", "source id", "id"],
+    "filename": ["filename", "file name", "file", "name"],
+    "title": ["title"],
+    "author": ["author", "authors"],
+    "year": ["year"],
+    "citation": ["citation", "citations", "cite"],
+    "venue": ["venue"],
+}
+
+
+def _clean(value):
+    value = str(value).strip()
+    return "" if value.lower() == "nan" else value
+
+
+def normalize_row(row):
+    # Works for pandas rows and for the stringified manifest rows in ingest_state.json
+    lowered = {str(k).strip().lower(): v for k, v in dict(row).items()}
+    entry = {}
+    for field, names in _ALIASES.items():
+        value = next((lowered[n] for n in names if n in lowered), "")
+        entry[field] = _clean(value)
+    entry["filename"] = os.path.basename(entry["filename"])
+    return entry
+
+
+def write_citation_table(path, rows):
+    table = {}
+    for row in rows:
+        entry = normalize_row(row)
+        if entry["source_id"]:
+            table[entry["source_id"]] = entry
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(table, f, indent=2, sort_keys=True, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return table
+
+
+def load_citation_table(path, manifest_path=None):
+    # Prefer the sidecar; fall back to reading the manifest directly
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Warning: Could not read citation table ({e}).")
+
+    if manifest_path and os.path.exists(manifest_path):
+        try:
+            df = pd.read_csv(manifest_path)
+            rows = [normalize_row(row) for _, row in df.iterrows()]
+            return {r["source_id"]: r for r in rows if r["source_id"]}
+        except Exception as e:
+            print(f"⚠️ Warning: Manifest error: {e}")
+    return {}
+
+
+def citation_map(table):
+    # source_id -> readable citation, falling back to the filename
+    return {s_id: entry.get("citation") or entry.get("filename") or s_id
+            for s_id, entry in table.items()}
@@ -0,0 +1,141 @@
+import os
+import json
+import numpy as np
+
+from hybrid import tokenize
+from query_expansion import eligible_term
+
+# --- RETRIEVAL-CONFIDENCE GATE ---
+# Out-of-corpus questions ("Quantum Computing in Yoruba", "Martian
+# languages") used to cost a full GPT-4o call just to get "Insufficient
+# Evidence" back. The gate looks at what retrieval found before the LLM is
+# called, using two signals:
+#
+#   * max_sim: cosine similarity of the question to its closest retrieved
+#     chunk. The chunk vectors are the ones already stored in the vector
+#     index (looked up by chunk id), so this needs no embedding call; only
+#     chunks the index doesn't hold are re-embedded.
+#   * coverage: the share of the question's content words that occur
+#     anywhere in the corpus (BM25 vocabulary). "quantum" or "martian"
+#     appear in no paper.
+#
+# If either signal is below its threshold, the service returns a structured
+# insufficient-evidence result without calling the LLM. The thresholds are
+# not guessed: src/eval/calibrate_gate.py fits them on labelled eval
+# questions and writes data/confidence_gate.json. Without that file the gate
+# stays off.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+GATE_PATH = os.path.join(BASE_DIR, "data", "confidence_gate.json")
+
+GATE_FEATURES = ("max_sim", "coverage")
+INSUFFICIENT_MESSAGE = ("Insufficient Evidence: none of the indexed papers is close enough to this question "
+                        "to answer it from the corpus.")
+
+
+def content_terms(question):
+    # The question's informative words, in order, without repeats
+    return [t for t in dict.fromkeys(tokenize(question)) if eligible_term(t)]
+
+
+def term_coverage(question, bm25_index):
+    # (share of content words in the corpus vocabulary, the missing words); None without BM25
+    if bm25_index is None or not bm25_index.bm25:
+        return None, []
+    terms = content_terms(question)
+    if not terms:
+        return 1.0, []
+    missing = [t for t in terms if t not in bm25_index.bm25.idf]
+    return round(1 - len(missing) / len(terms), 4), missing
+
+
+def chunk_similarities(question_vector, docs, embeddings, stored=None):
+    # Cosine of the question to each retrieved chunk, best first. `stored`
+    # maps chunk id -> vector already in the index; the rest are embedded.
+    # Returns (similarities, number of chunks that had to be embedded)
+    if not docs:
+        return [], 0
+    stored = stored or {}
+    missing = [doc for doc in docs if doc.id not in stored]
+    embedded = embeddings.embed_documents([doc.page_content for doc in missing]) if missing else []
+    fresh = iter(embedded)
+    vectors = np.asarray([stored[doc.id] if doc.id in stored else next(fresh) for doc in docs], dtype="float32")
+    query = np.asarray(question_vector, dtype="float32")
+    sims = vectors @ query / np.maximum(np.linalg.norm(vectors, axis=1) * np.linalg.norm(query), 1e-12)
+    return sorted((round(float(s), 4) for s in sims), reverse=True), len(missing)
+
+
+def gate_features(question, question_vector, docs, embeddings, bm25_index, stored=None):
+    sims, embedded = chunk_similarities(question_vector, docs, embeddings, stored)
+    coverage, missing = term_coverage(question, bm25_index)
+    return {
+        "max_sim": sims[0] if sims else 0.0,
+        "mean_top3_sim": round(float(np.mean(sims[:3])), 4) if sims else 0.0,
+        "coverage": coverage,
+        "missing_terms": missing,
+        "chunks": len(docs),
+        "embedded_chunks": embedded,
+    }
+
+
+class ConfidenceGate:
+    def __init__(self, thresholds):
+        # {"max_sim": float, "coverage": float}; a missing or None threshold is not checked
+        self.thresholds = thresholds
+
+    @classmethod
+    def load(cls, path=GATE_PATH):
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["thresholds"])
+
+    def check(self, features):
+        # Returns (passed, reasons)
+        reasons = []
+        for name in GATE_FEATURES:
+            threshold = self.thresholds.get(name)
+            value = features.get(name)
+            if threshold is not None and value is not None and value < threshold:
+                reasons.append(f"{name} {value} < {threshold}")
+        return not reasons, reasons
+
+    def describe(self):
+        return ",".join(f"{name}={self.thresholds.get(name)}" for name in GATE_FEATURES)
+
+
+def _candidates(values):
+    # Thresholds worth trying: off, and midway between neighbouring observed values
+    values = sorted(set(v for v in values if v is not None))
+    return [None] + [round((a + b) / 2, 4) for a, b in zip(values, values[1:])] + \
+        ([round(values[-1] + 1e-4, 4)] if values else [])
+
+
+def calibrate(samples, max_false_rejects=0):
+    # samples: [{"features": {...}, "answerable": bool}]. Picks the thresholds
+    # that reject the most unanswerable questions while rejecting at most
+    # max_false_rejects answerable ones; among ties, the most lenient.
+    best = None
+    for sim_t in _candidates(s["features"]["max_sim"] for s in samples):
+        for cov_t in _candidates(s["features"]["coverage"] for s in samples):
+            gate = ConfidenceGate({"max_sim": sim_t, "coverage": cov_t})
+            rejected = [not gate.check(s["features"])[0] for s in samples]
+            false_rejects = sum(r and s["answerable"] for r, s in zip(rejected, samples))
+            true_rejects = sum(r and not s["answerable"] for r, s in zip(rejected, samples))
+            if false_rejects > max_false_rejects:
+                continue
+            leniency = -((sim_t or 0.0) + (cov_t or 0.0))
+            key = (true_rejects, -false_rejects, leniency)
+            if best is None or key > best[0]:
+                best = (key, {"max_sim": sim_t, "coverage": cov_t}, true_rejects, false_rejects)
+
+    _, thresholds, true_rejects, false_rejects = best
+    unanswerable = sum(not s["answerable"] for s in samples)
+    report = {
+        "thresholds": thresholds,
+        "samples": len(samples),
+        "unanswerable": unanswerable,
+        "unanswerable_rejected": true_rejects,
+        "answerable_rejected": false_rejects,
+    }
+    return thresholds, report
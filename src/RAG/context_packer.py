@@ -0,0 +1,131 @@
+from functools import lru_cache
+from itertools import combinations
+from langchain_core.documents import Document
+
+# --- TOKEN-BUDGETED CONTEXT PACKING ---
+# Prompt size drives GPT-4o latency and cost, so the context is assembled
+# against a token budget instead of concatenating every retrieved chunk:
+#
+#   1. Chunks from the same paper and page that overlap (the splitter repeats
+#      up to 200 chars between neighbours) are stitched into one block, with
+#      the repeated text kept once. A block ranks where its best chunk did.
+#   2. Blocks are added in relevance order while they fit; the first one that
+#      doesn't is cut to the remaining budget (if enough is left to be useful,
+#      or if nothing has been sent yet).
+#
+# pack_context() also reports how many tokens were actually sent.
+
+MIN_OVERLAP = 20           # shorter suffix/prefix matches are coincidence
+MAX_OVERLAP = 300          # a little above the splitter's 200-char overlap
+MIN_PARTIAL_TOKENS = 100   # don't bother sending a sliver of a block
+
+
+class _ApproxEncoding:
+    # ~4 characters per token, same estimate as embed_pipeline.estimate_tokens
+    def encode(self, text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model="gpt-4o"):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; don't fail a query over it
+        print(f"⚠️ Warning: tiktoken unavailable ({type(e).__name__}). Estimating tokens as chars / 4.")
+        return _ApproxEncoding()
+
+
+def count_tokens(text, model="gpt-4o"):
+    return len(get_encoding(model).encode(text))
+
+
+def _overlap(a, b):
+    # Length of the longest suffix of a that is also a prefix of b
+    for k in range(min(len(a), len(b), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _page_key(metadata):
+    # Only chunks of the same page can be neighbours; no page, no merging
+    page = metadata.get("page")
+    return None if page is None else (metadata.get("source_id"), page)
+
+
+def _stitch(a, b):
+    # a and b joined with their shared text kept once, or None if they don't overlap
+    k = _overlap(a, b)
+    if k:
+        return a + b[k:]
+    k = _overlap(b, a)
+    if k:
+        return b + a[k:]
+    return None
+
+
+def merge_overlaps(docs):
+    # docs best first -> (blocks best first, number of chunks merged away).
+    # Stitching repeats until stable, since one merge can make a block
+    # overlap another.
+    blocks = [[doc.metadata, doc.page_content] for doc in docs]
+    merged = 0
+    changed = True
+    while changed:
+        changed = False
+        for i, j in combinations(range(len(blocks)), 2):
+            key = _page_key(blocks[i][0])
+            if key is None or key != _page_key(blocks[j][0]):
+                continue
+            text = _stitch(blocks[i][1], blocks[j][1])
+            if text is not None:
+                blocks[i][1] = text   # i < j, so the block keeps the better rank
+                del blocks[j]
+                merged += 1
+                changed = True
+                break
+    return [Document(page_content=text, metadata=metadata) for metadata, text in blocks], merged
+
+
+def pack_context(docs, budget_tokens=3000, model="gpt-4o"):
+    # Returns (context_text, docs actually sent, stats)
+    encoding = get_encoding(model)
+    blocks, merged = merge_overlaps(docs)
+
+    parts, sent, used, truncated, dropped = [], [], 0, 0, 0
+    for doc in blocks:
+        piece = f"[{doc.metadata.get('source_id', 'Unknown')}] {doc.page_content}\n\n"
+        tokens = encoding.encode(piece)
+        if used + len(tokens) <= budget_tokens:
+            parts.append(piece)
+            sent.append(doc)
+            used += len(tokens)
+            continue
+        remaining = budget_tokens - used
+        if (remaining >= MIN_PARTIAL_TOKENS or not sent) and remaining > 0 and not truncated:
+            piece = encoding.decode(tokens[:remaining - 1]).rstrip() + "\n\n"
+            parts.append(piece)
+            sent.append(Document(page_content=piece.split("] ", 1)[-1].strip(), metadata=doc.metadata))
+            used += len(encoding.encode(piece))
+            truncated += 1
+        else:
+            dropped += 1
+
+    stats = {
+        "tokens": used,
+        "budget": budget_tokens,
+        "chunks_in": len(docs),
+        "blocks_sent": len(sent),
+        "merged": merged,
+        "truncated": truncated,
+        "dropped": dropped,
+    }
+    return "".join(parts), sent, stats
@@ -0,0 +1,171 @@
+import re
+import zlib
+from collections import Counter
+import numpy as np
+
+# --- NEAR-DUPLICATE DETECTION ---
+# Repeated headers, footers and reference blocks, plus chunk overlap, crowd
+# the top-k with text that adds no evidence. Three tools live here:
+#
+#   * strip_boilerplate  - drops lines that repeat across the pages of one
+#     paper (running titles, page numbers, journal footers) before chunking.
+#     This is what removes boilerplate: it sits *inside* otherwise distinct
+#     chunks, so whole-chunk comparison never catches it.
+#   * NearDuplicateIndex - MinHash + LSH banding over whole chunks at ingest.
+#     Only catches chunks that are near-identical as a whole (duplicated
+#     pages, repeated tables); on our corpus that is well under 1% of chunks.
+#   * dedupe_documents   - exact shingle-Jaccard over a handful of retrieved
+#     chunks, shared by every query path (replaces the old
+#     source_id + page_content[:20] key)
+
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+
+# A line is boilerplate if it sits in the first/last BOILERPLATE_EDGE_LINES
+# lines of a page and shows up there on at least this share of a paper's
+# pages (and on BOILERPLATE_MIN_PAGES of them). Only page edges are looked at,
+# so repeated numbers inside tables are left alone.
+BOILERPLATE_EDGE_LINES = 4
+BOILERPLATE_PAGE_RATIO = 0.3
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_MAX_LINE = 200
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"\w+")
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    # Word k-shingles over normalised text; very short texts become one shingle
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) <= k:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def _line_key(line):
+    # "Page 3 of 20" and "Page 4 of 20" are the same footer
+    return _SPACE_RE.sub(" ", _DIGITS_RE.sub("#", line.lower())).strip()
+
+
+def _edge(index, count, edge=BOILERPLATE_EDGE_LINES):
+    return index < edge or index >= count - edge
+
+
+def strip_boilerplate(pages, page_ratio=BOILERPLATE_PAGE_RATIO, min_pages=BOILERPLATE_MIN_PAGES):
+    # Removes, in place, header/footer lines repeated across the pages of one
+    # paper (running titles, page numbers, licence footers). Returns
+    # (lines_removed, chars_removed).
+    page_lines = [page.page_content.split("\n") for page in pages]
+    edge_keys = [{_line_key(line) for i, line in enumerate(lines) if _edge(i, len(lines))}
+                 for lines in page_lines]
+    pages_with = Counter(key for keys in edge_keys for key in keys if key and len(key) <= BOILERPLATE_MAX_LINE)
+    cutoff = max(min_pages, page_ratio * len(pages))
+    repeated = {key for key, count in pages_with.items() if count >= cutoff}
+    if not repeated:
+        return 0, 0
+
+    lines_removed = chars_removed = 0
+    for page, lines in zip(pages, page_lines):
+        kept = []
+        for i, line in enumerate(lines):
+            if _edge(i, len(lines)) and _line_key(line) in repeated:
+                lines_removed += 1
+                chars_removed += len(line)
+            else:
+                kept.append(line)
+        page.page_content = "\n".join(kept)
+    return lines_removed, chars_removed
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    def __init__(self, num_perm=64, seed=42):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        if not shingle_set:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+            dtype=np.uint64, count=len(shingle_set)
+        )
+        # (a*x + b) mod p for every permutation at once, then min per row
+        perms = (np.outer(self.a, hashes) + self.b[:, None]) % _MERSENNE_PRIME
+        return (perms & _MAX_HASH).min(axis=1)
+
+
+class NearDuplicateIndex:
+    # bands x rows must equal num_perm; 8 x 8 puts the LSH S-curve around
+    # Jaccard ~0.77, and candidates are then checked against `threshold`
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=64, bands=8):
+        assert num_perm % bands == 0, "num_perm must be divisible by bands"
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = {}
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, text):
+        # Returns (key_of_duplicate or None, signature)
+        signature = self.hasher.signature(shingles(text))
+        seen = set()
+        for band, band_key in self._band_keys(signature):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= self.threshold:
+                    return candidate, signature
+        return None, signature
+
+    def add(self, key, text=None, signature=None):
+        if signature is None:
+            signature = self.hasher.signature(shingles(text))
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def add_if_new(self, key, text):
+        # Returns the key this text duplicates, or None (and indexes it)
+        duplicate_of, signature = self.find(text)
+        if duplicate_of is None:
+            self.add(key, signature=signature)
+        return duplicate_of
+
+
+def dedupe_chunks(chunks, threshold=DEFAULT_THRESHOLD):
+    # Ingest-time: drop near-duplicate chunks of one paper before embedding.
+    # Returns (kept_indices, dropped_count); order is preserved.
+    index = NearDuplicateIndex(threshold=threshold)
+    kept = [i for i, chunk in enumerate(chunks) if index.add_if_new(i, chunk.page_content) is None]
+    return kept, len(chunks) - len(kept)
+
+
+def dedupe_documents(docs, threshold=DEFAULT_THRESHOLD):
+    # Query-time: keep the first (best-ranked) of every group of near-identical
+    # chunks. Retrieval returns tens of docs, so exact pairwise Jaccard is cheap.
+    kept, kept_shingles = [], []
+    for doc in docs:
+        s = shingles(doc.page_content)
+        if any(jaccard(s, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(s)
+    return kept
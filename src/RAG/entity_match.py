@@ -0,0 +1,158 @@
+import re
+import difflib
+import unicodedata
+from collections import deque
+
+# --- PAPER MENTION DETECTION ---
+# Questions like "the Cheetah paper", "Conneau (2020)" or "Wu et al. (2025)"
+# name the paper they are about. PaperMatcher turns the citation table into
+# aliases (full title, short name before the colon, acronym in brackets,
+# author surname with "et al." / year) and finds them in one Aho-Corasick
+# pass over the normalized question, plus a fuzzy pass over single-word
+# short names for typos ("Afrobenh"). The service turns the hits into a
+# source_id filter for the vector and BM25 searches.
+
+FUZZY_CUTOFF = 0.85
+MIN_FUZZY_LEN = 5
+MIN_BARE_SURNAME_LEN = 6    # shorter surnames ("Wu", "Xu") need "et al." or a year
+
+# Short names made only of these are too generic to match ("Where Are We?")
+_STOPWORDS = {
+    "a", "an", "the", "of", "on", "in", "for", "and", "to", "with", "are", "is",
+    "we", "where", "what", "how", "from", "by", "at", "it", "good", "new", "llms",
+    "language", "languages", "model", "models", "large", "survey",
+}
+
+
+def normalize(text):
+    # Lowercase, strip accents (Yorùbá -> yoruba), punctuation -> spaces
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.lower().replace("&", " and ")
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def paper_aliases(entry):
+    # -> (aliases for exact matching, single-word names for fuzzy matching)
+    aliases, fuzzy = set(), set()
+    title = entry.get("title", "")
+    if title:
+        aliases.add(normalize(title))
+        short = re.split(r"[:?]", title, maxsplit=1)[0]
+        short_norm = normalize(re.sub(r"\(.*?\)", "", short))
+        words = short_norm.split()
+        if short_norm != normalize(title) and 0 < len(words) <= 4 and set(words) - _STOPWORDS:
+            aliases.add(short_norm)
+            if len(words) == 1 and len(short_norm) >= MIN_FUZZY_LEN:
+                fuzzy.add(short_norm)
+        for acronym in re.findall(r"\(([^)]+)\)", title):
+            aliases.add(normalize(acronym))
+
+    author = re.sub(r"\bet al\.?", "", entry.get("author", "")).strip()
+    year = str(entry.get("year", "")).strip()
+    if author:
+        surname = normalize(author)
+        first = normalize(re.split(r"&| and ", author)[0])
+        for name in {surname, first}:
+            aliases.add(f"{name} et al")
+            if year:
+                aliases.add(f"{name} {year}")
+                aliases.add(f"{name} et al {year}")
+            if len(name) >= MIN_BARE_SURNAME_LEN:
+                aliases.add(name)
+    return {a for a in aliases if a}, fuzzy
+
+
+class AhoCorasick:
+    # Multi-pattern matcher: one pass over the text, however many aliases
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern in patterns:
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node].append(pattern)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def find(self, text):
+        # Yields (start, end, pattern)
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pattern in self.out[node]:
+                yield i + 1 - len(pattern), i + 1, pattern
+
+
+class PaperMatcher:
+    def __init__(self, table):
+        # table: the citation table (source_id -> entry) from citations.py
+        self.alias_ids = {}
+        self.fuzzy_ids = {}
+        for s_id, entry in table.items():
+            aliases, fuzzy = paper_aliases(entry)
+            for alias in aliases:
+                self.alias_ids.setdefault(alias, set()).add(s_id)
+            for name in fuzzy:
+                self.fuzzy_ids.setdefault(name, set()).add(s_id)
+        # Padding with spaces makes every hit a whole-word hit
+        self.automaton = AhoCorasick([f" {alias} " for alias in self.alias_ids])
+
+    def match(self, question):
+        # Returns the source_ids the question refers to, in order of mention
+        text = f" {normalize(question)} "
+        hits = [(start, end, pattern.strip()) for start, end, pattern in self.automaton.find(text)]
+        # Keep the most specific alias where hits overlap ("wu et al 2025" beats "wu et al")
+        hits.sort(key=lambda h: (h[0], -(h[1] - h[0])))
+        found, covered_until = [], -1
+        for start, end, alias in hits:
+            if end <= covered_until:
+                continue
+            covered_until = max(covered_until, end)
+            found.append((start, self.alias_ids[alias]))
+
+        if self.fuzzy_ids:
+            tokens = text.split()
+            # Single tokens and joined neighbours ("iroko bench" -> "irokobench")
+            candidates = tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+            for position, token in enumerate(candidates):
+                if len(token) < MIN_FUZZY_LEN or token in self.alias_ids:
+                    continue
+                close = difflib.get_close_matches(token, self.fuzzy_ids, n=1, cutoff=FUZZY_CUTOFF)
+                if close:
+                    found.append((len(text) + position, self.fuzzy_ids[close[0]]))
+
+        ordered = []
+        for _, ids in sorted(found, key=lambda f: f[0]):
+            for s_id in sorted(ids):
+                if s_id not in ordered:
+                    ordered.append(s_id)
+        return ordered
+
+
+def source_filter(source_ids):
+    # Chroma-style where clause for the matched papers
+    if not source_ids:
+        return None
+    if len(source_ids) == 1:
+        return {"source_id": source_ids[0]}
+    return {"source_id": {"$in": list(source_ids)}}
@@ -0,0 +1,178 @@
+import os
+import re
+import time
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from typing import Any, List
+from rank_bm25 import BM25Okapi
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from vector_index import matches_filter, dense_search_by_vector
+
+# --- HYBRID RETRIEVAL (BM25 + DENSE, FUSED WITH RRF) ---
+# Dense embeddings blur exact terms ("IrokoBench", "XLM-R vs mBERT"). BM25
+# catches them. ingest.py builds a BM25 index over the same chunks that are
+# in Chroma and pickles it next to the DB; HybridRetriever runs both searches
+# and merges the two rankings with reciprocal rank fusion.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BM25_PATH = os.path.join(BASE_DIR, "data", "bm25_index.pkl")
+
+RRF_K = 60
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, ids, texts, metadatas):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.bm25 = BM25Okapi([tokenize(t) for t in texts]) if texts else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=20, where=None):
+        # Returns [(Document, score)] best first. `where` is an optional
+        # {field: value} or {field: {"$in": [...]}} metadata filter.
+        if not self.bm25:
+            return []
+        scores = self.bm25.get_scores(tokenize(query))
+        if where:
+            mask = np.array([matches_filter(meta, where) for meta in self.metadatas], dtype=bool)
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (Document(page_content=self.texts[i], metadata=self.metadatas[i], id=self.ids[i]), float(scores[i]))
+            for i in top if scores[i] > 0
+        ]
+
+
+def build_bm25_index(vector_store, path=BM25_PATH, page_size=5000):
+    # Reads the chunk texts back out of Chroma so BM25 always matches what is
+    # actually indexed, even after incremental ingests
+    collection = vector_store._collection
+    ids, texts, metadatas = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        texts.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        offset += len(page["ids"])
+
+    index = BM25Index(ids, texts, metadatas)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return index
+
+
+def load_bm25_index(path=BM25_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"⚠️ Warning: Could not load BM25 index ({e}). Using dense retrieval only.")
+        return None
+
+
+def doc_key(doc):
+    # Chroma ids when present, otherwise source + text
+    return doc.id or f"{doc.metadata.get('source_id', '')}:{hash(doc.page_content)}"
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K, limit=None):
+    # score(d) = sum over lists of 1 / (k + rank(d)); ranks start at 1
+    scores = {}
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    order = sorted(scores, key=scores.get, reverse=True)
+    if limit:
+        order = order[:limit]
+    return [docs[key] for key in order]
+
+
+class HybridRetriever(BaseRetriever):
+    # Drop-in for vector_store.as_retriever(...): same .invoke(question) API
+    dense_retriever: Any
+    bm25_index: Any = None
+    k: int = 12
+    bm25_k: int = 20
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        docs, _ = self.retrieve_with_timings(query)
+        return docs
+
+    def retrieve_with_timings(self, query, query_vector=None):
+        # Returns (docs, {"dense": s, "bm25": s, "fusion": s}) so callers can
+        # log BM25 scoring and fusion latency separately. Pass query_vector
+        # if the query is already embedded.
+        timings = {}
+
+        start = time.perf_counter()
+        if query_vector is None:
+            dense_docs = self.dense_retriever.invoke(query)
+        else:
+            dense_docs = dense_search_by_vector(self.dense_retriever, query_vector)
+        timings["dense"] = time.perf_counter() - start
+
+        if self.bm25_index is None or len(self.bm25_index) == 0:
+            return dense_docs[:self.k], _rounded(timings)
+
+        start = time.perf_counter()
+        where = getattr(self.dense_retriever, "search_kwargs", {}).get("filter")
+        bm25_docs = [doc for doc, _ in self.bm25_index.search(query, k=self.bm25_k, where=where)]
+        timings["bm25"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fused = reciprocal_rank_fusion([dense_docs, bm25_docs], k=self.rrf_k, limit=self.k)
+        timings["fusion"] = time.perf_counter() - start
+
+        return fused, _rounded(timings)
+
+
+def _rounded(timings):
+    return {name: round(seconds, 4) for name, seconds in timings.items()}
+
+
+def multi_query_retrieve(retriever, embeddings, queries, limit=None):
+    # Query expansion without paying per query: all queries are embedded in
+    # one batch call, the searches run concurrently, and the per-query
+    # rankings are merged with RRF (a chunk several queries agree on rises
+    # to the top). Returns (docs, timings).
+    timings = {}
+
+    start = time.perf_counter()
+    embed_batch = getattr(embeddings, "embed_queries", embeddings.embed_documents)
+    vectors = embed_batch(queries)
+    timings["embed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(queries))) as pool:
+        rankings = list(pool.map(lambda qv: retriever.retrieve_with_timings(*qv)[0], zip(queries, vectors)))
+    timings["search"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fused = reciprocal_rank_fusion(rankings, k=retriever.rrf_k, limit=limit)
+    timings["fusion"] = time.perf_counter() - start
+
+    return fused, _rounded(timings)
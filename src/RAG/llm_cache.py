@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+# --- LLM RESPONSE CACHE ---
+# Both LLMs run at temperature 0, so the same rendered prompt gets the same
+# answer. Eval re-runs and app sessions keep sending identical prompts, and
+# this cache answers them from SQLite instead of the API.
+#
+# It plugs into LangChain's own cache hook (`ChatOpenAI(cache=...)`), so every
+# chain that uses the model is covered: the answer prompt, the query-expansion
+# prompt in query.py, eval. The key is a hash of the model + parameters string
+# LangChain builds (model name, temperature, ...) and the fully rendered
+# prompt. Any change to either is a different entry. .stream() skips
+# LangChain's cache, so streamed calls go through stream_with_cache().
+#
+# Modes (RAG_LLM_CACHE):
+#   on      read and write (default)
+#   replay  read-only; a miss raises LLMCacheMiss instead of calling the API,
+#           for offline benchmark runs
+#   off     no cache
+# Eviction is LRU by total stored size (RAG_LLM_CACHE_MB).
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "data", "llm_cache.sqlite")
+DEFAULT_MAX_MB = 200
+
+LLM_CACHE_MODE = os.getenv("RAG_LLM_CACHE", "on")
+LLM_CACHE_MAX_MB = float(os.getenv("RAG_LLM_CACHE_MB", DEFAULT_MAX_MB))
+
+
+class LLMCacheMiss(RuntimeError):
+    pass
+
+
+def cache_key(prompt, llm_string):
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def _to_json(generations):
+    # Text and generation info only: all our chains read .content
+    return json.dumps([{
+        "text": gen.text,
+        "chat": isinstance(gen, ChatGeneration),
+        "info": gen.generation_info,
+    } for gen in generations])
+
+
+def _from_json(value):
+    return [ChatGeneration(message=AIMessage(content=item["text"]), generation_info=item["info"])
+            if item["chat"] else Generation(text=item["text"], generation_info=item["info"])
+            for item in json.loads(value)]
+
+
+class LLMResponseCache(BaseCache):
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_MAX_MB, replay=False):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                llm TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                cost_seconds REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+        self._pending = {}   # key -> time of the miss, to record how long the call took
+
+    def lookup(self, prompt, llm_string):
+        key = cache_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value, cost_seconds FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.hits += 1
+                self.seconds_saved += row[1]
+                if not self.replay:
+                    self._conn.execute("UPDATE responses SET hits = hits + 1, last_access = ? WHERE key = ?",
+                                       (time.time(), key))
+                    self._conn.commit()
+                return _from_json(row[0])
+            self.misses += 1
+            self._pending[key] = time.time()
+        if self.replay:
+            raise LLMCacheMiss(f"No cached response for this prompt (replay mode, key {key[:12]})")
+        return None
+
+    def update(self, prompt, llm_string, return_val):
+        if self.replay:
+            return
+        key = cache_key(prompt, llm_string)
+        value = _to_json(return_val)
+        now = time.time()
+        with self._lock:
+            cost = now - self._pending.pop(key, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, llm, value, size, cost_seconds, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, llm_string, value, len(value.encode("utf-8")), cost, now, now)
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        # LRU by size: once over the cap, trim back to 90% so we don't evict on every insert
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed, doomed = 0, []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if freed >= target:
+                break
+            doomed.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._conn.commit()
+        self.evictions += len(doomed)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "seconds_saved": round(self.seconds_saved, 2),
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_mb": round(size / (1024 * 1024), 3),
+            "replay": self.replay,
+        }
+
+
+def make_llm_cache(mode=LLM_CACHE_MODE, path=DEFAULT_CACHE_PATH, max_mb=LLM_CACHE_MAX_MB):
+    # Value for the chat model's `cache=` argument. False (not None) when off,
+    # so a globally configured LangChain cache doesn't sneak back in.
+    if mode == "off":
+        return False
+    if mode not in ("on", "replay"):
+        raise ValueError(f"RAG_LLM_CACHE must be on, replay or off (got {mode!r})")
+    return LLMResponseCache(path, max_mb=max_mb, replay=mode == "replay")
+
+
+def stream_with_cache(llm, prompt_value):
+    # llm.stream() through the same cache: a hit comes back as one chunk, a
+    # miss streams as usual and is stored once complete
+    cache = getattr(llm, "cache", None)
+    cache = cache if isinstance(cache, BaseCache) else None
+    if cache is None:
+        yield from llm.stream(prompt_value)
+        return
+    prompt = dumps(prompt_value.to_messages())
+    llm_string = llm._get_llm_string()
+    cached = cache.lookup(prompt, llm_string)
+    if cached:
+        yield cached[0].message
+        return
+    full = None
+    for chunk in llm.stream(prompt_value):
+        full = chunk if full is None else full + chunk
+        yield chunk
+    if full is not None:
+        cache.update(prompt, llm_string, [ChatGeneration(message=AIMessage(content=full.content))])
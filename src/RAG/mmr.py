@@ -0,0 +1,81 @@
+import numpy as np
+from typing import Any, Dict, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# --- VECTORIZED MMR ---
+# Maximal marginal relevance over a large candidate pool (fetch_k in the
+# hundreds). The stock LangChain path loops in Python and recomputes
+# similarities against the selected set on every step; here the candidate
+# embeddings come back in one bulk call, relevance is a single BLAS matvec,
+# and each selection step is one vectorized update of a running "max
+# similarity to anything already picked" array. Only the k rows of the
+# candidate x candidate cosine matrix that MMR actually reads get computed -
+# with k=12 and fetch_k=1000 the full matrix would be ~80x wasted work.
+#
+#   score(d) = lambda * sim(q, d) - (1 - lambda) * max_{s in selected} sim(d, s)
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype="float32")
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vector, candidate_vectors, k=4, lambda_mult=0.5, min_score=None):
+    # Returns the indices of the picked candidates, in pick order.
+    # min_score: early stop - quit as soon as the best remaining MMR score
+    # falls below it (e.g. everything left is a near-copy of a picked chunk).
+    candidates = _normalize(candidate_vectors)
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+
+    relevance = candidates @ _normalize(query_vector).reshape(-1)
+
+    picked = [int(np.argmax(relevance))]
+    available = np.ones(n, dtype=bool)
+    available[picked[0]] = False
+    max_redundancy = candidates @ candidates[picked[0]]
+
+    while len(picked) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        if min_score is not None and scores[best] < min_score:
+            break
+        picked.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, candidates @ candidates[best], out=max_redundancy)
+    return picked
+
+
+class ChromaMMRRetriever(BaseRetriever):
+    # MMR over a Chroma collection: one query() returns the top fetch_k
+    # documents together with their stored embeddings (no second fetch, no
+    # re-embedding), then mmr_select() picks k of them
+    vector_store: Any
+    embeddings: Any
+    search_kwargs: Dict[str, Any] = {}
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self.search_by_vector(self.embeddings.embed_query(query))
+
+    def search_by_vector(self, query_vector):
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = self.search_kwargs.get("fetch_k", 20)
+
+        result = self.vector_store._collection.query(
+            query_embeddings=[query_vector], n_results=fetch_k,
+            where=self.search_kwargs.get("filter"),
+            include=["documents", "metadatas", "embeddings"],
+        )
+        ids = result["ids"][0]
+        if not len(ids):
+            return []
+        picked = mmr_select(query_vector, result["embeddings"][0], k=k,
+                            lambda_mult=self.search_kwargs.get("lambda_mult", 0.5),
+                            min_score=self.search_kwargs.get("min_score"))
+        return [Document(page_content=result["documents"][0][i], metadata=result["metadatas"][0][i] or {},
+                         id=ids[i]) for i in picked]
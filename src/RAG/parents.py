@@ -0,0 +1,100 @@
+import os
+import json
+import sqlite3
+import threading
+from langchain_core.documents import Document
+
+# --- SMALL-TO-BIG PARENT STORE ---
+# Ingest splits every PDF page into chunks and (before this) threw the page
+# away. Now each page is kept once in a SQLite table, and every chunk carries
+# a `parent_id` pointing at it. Retrieval still searches the small, precise
+# chunks; expand_to_parents() then swaps the winning hits for their full page
+# - fetched lazily for the winners only, each page once, however many of its
+# chunks matched.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_PARENTS_PATH = os.path.join(BASE_DIR, "data", "parents.sqlite")
+
+
+def parent_ids(key, sha256, count):
+    # One id per page, same scheme as chunk_ids() in ingest_state.py
+    return [f"{key}:{sha256[:12]}:p{i:04d}" for i in range(count)]
+
+
+class ParentStore:
+    def __init__(self, path=DEFAULT_PARENTS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS parents (
+                parent_id TEXT PRIMARY KEY,
+                source_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_parents_source ON parents(source_id)")
+        self._conn.commit()
+
+    def replace_source(self, source_id, items):
+        # items: iterable of (parent_id, text, metadata). Drops the paper's old pages.
+        rows = [(pid, source_id, text, json.dumps(metadata)) for pid, text, metadata in items]
+        with self._lock:
+            self._conn.execute("DELETE FROM parents WHERE source_id = ?", (source_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO parents (parent_id, source_id, text, metadata) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM parents")
+            self._conn.commit()
+
+    def delete_source(self, source_id):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM parents WHERE source_id = ?", (source_id,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def get_many(self, ids):
+        # Returns {parent_id: (text, metadata)} for the ids we have
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT parent_id, text, metadata FROM parents WHERE parent_id IN ({marks})", ids).fetchall()
+        return {pid: (text, json.loads(metadata)) for pid, text, metadata in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+
+def expand_to_parents(docs, store, max_parents=4):
+    # Child hits (best first) -> the top `max_parents` distinct parent pages,
+    # in the rank of their best child. Lower-ranked children whose page is
+    # already in stay out; the rest (and chunks ingested before parents were
+    # stored) are passed through as they are.
+    wanted = []
+    for doc in docs:
+        pid = doc.metadata.get("parent_id")
+        if pid and pid not in wanted and len(wanted) < max_parents:
+            wanted.append(pid)
+    parents = store.get_many(wanted)
+
+    expanded, used = [], set()
+    for doc in docs:
+        pid = doc.metadata.get("parent_id")
+        if pid in parents:
+            if pid not in used:
+                used.add(pid)
+                text, metadata = parents[pid]
+                expanded.append(Document(page_content=text, metadata={**metadata, "parent_id": pid}, id=pid))
+        else:
+            expanded.append(doc)
+    return expanded
@@ -1,39 +1,62 @@
 import sys
 import os
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from dedupe import dedupe_documents
+from hybrid import multi_query_retrieve
+from service import get_service
 
 # Load env
 load_dotenv()
 
-# Define Paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
+# How extra search queries are made: "llm" (GPT-4o brainstorms 3), "local"
+# (corpus feedback + co-occurrence terms, no LLM call, see query_expansion.py)
+# or "none" (the question alone)
+QUERY_EXPANSION = os.getenv("RAG_QUERY_EXPANSION", "llm")
+EXPANSION_MODES = ("llm", "local", "none")
+
+# The "Brainstorming" Prompt
+# This prompt asks the LLM to act as a search engine expert
+query_gen_prompt = ChatPromptTemplate.from_template("""
+You are a helpful research assistant.
+The user is asking a question about NLP, African Languages, or AI.
+Generate 3 specific search queries to help find the answer in a database of academic papers.
+Focus on technical keywords (e.g., "fine-tuning", "XLM-R", "data augmentation").
+
+User Question: {question}
+
+Output ONLY the 3 queries separated by newlines. No numbering.
+""")
+
+def expand_queries(service, question, mode=QUERY_EXPANSION):
+    # Returns the search queries for the question (original included)
+    if mode == "llm":
+        gen_chain = query_gen_prompt | service.llm
+        search_queries_response = gen_chain.invoke({"question": question})
+        # Split the response into a list of 3 strings
+        search_queries = search_queries_response.content.strip().split('\n')
+
+        # Add the original question too, just in case
+        search_queries.append(question)
+
+        # Clean up list (remove empty strings)
+        return [q.strip() for q in search_queries if q.strip()]
+    if mode == "local":
+        search_queries, info = service.query_expander.expand(question)
+        print(f"      -> Local terms: {info['feedback_terms']} / {info['neighbour_terms']} ({info['seconds']}s)")
+        return search_queries
+    if mode == "none":
+        return [question]
+    raise ValueError(f"Unknown query expansion mode {mode!r} (use one of {EXPANSION_MODES})")
 
 def query_system_advanced():
-    print("Loading RAG with Query Expansion...")
+    print(f"Loading RAG with Query Expansion ({QUERY_EXPANSION})...")
     
     # 1. Setup Standard Components
-    # We use the standard vector store and LLM we used in eval.py
-    vector_store = Chroma(persist_directory=DB_PATH, embedding_function=OpenAIEmbeddings())
-    retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-
-    # 2. Define the "Brainstorming" Prompt
-    # This prompt asks the LLM to act as a search engine expert
-    query_gen_prompt = ChatPromptTemplate.from_template("""
-    You are a helpful research assistant.
-    The user is asking a question about NLP, African Languages, or AI.
-    Generate 3 specific search queries to help find the answer in a database of academic papers.
-    Focus on technical keywords (e.g., "fine-tuning", "XLM-R", "data augmentation").
-    
-    User Question: {question}
-    
-    Output ONLY the 3 queries separated by newlines. No numbering.
-    """)
-
+    # We use the standard vector store and LLM we used in eval.py (shared service)
+    service = get_service()
+    retriever = service.hybrid_retriever(k=5)
+    llm = service.llm
 
     answer_prompt = ChatPromptTemplate.from_template("""
     You are an expert researcher. Synthesize the provided context to answer.
@@ -57,36 +80,18 @@ def query_system_advanced():
         if question.lower() in ['exit', 'quit', 'q']:
             break
 
-        print(f"   🧠 Brainstorming synonyms...")
-        
-    
-        gen_chain = query_gen_prompt | llm
-        search_queries_response = gen_chain.invoke({"question": question})
-        # Split the response into a list of 3 strings
-        search_queries = search_queries_response.content.strip().split('\n')
-        
-        # Add the original question too, just in case
-        search_queries.append(question)
-        
-        # Clean up list (remove empty strings)
-        search_queries = [q.strip() for q in search_queries if q.strip()]
+        print(f"   🧠 Brainstorming synonyms ({QUERY_EXPANSION})...")
+        search_queries = expand_queries(service, question)
         print(f"      -> Generated Queries: {search_queries}")
 
 
-        unique_docs = {}
-        for query in search_queries:
-            # Run the retrieval for EACH query
-            docs = retriever.invoke(query)
-            for doc in docs:
-                # Deduplicate: Don't add the same chunk twice
-                # We create a unique key using the Source ID + the first 20 chars of text
-                key = doc.metadata.get('source_id', 'unknown') + doc.page_content[:20]
-                if key not in unique_docs:
-                    unique_docs[key] = doc
-        
-        # Convert back to a list
-        final_docs = list(unique_docs.values())
-        print(f"      -> Found {len(final_docs)} unique relevant chunks.")
+        # Retrieve for ALL queries at once (one embedding call, parallel
+        # searches) and rank chunks by how many queries agree on them
+        fused_docs, timings = multi_query_retrieve(retriever, service.embeddings, search_queries)
+
+        # Deduplicate: Don't add the same (or a near-identical) chunk twice
+        final_docs = dedupe_documents(fused_docs)
+        print(f"      -> Found {len(final_docs)} unique relevant chunks. ({timings})")
 
     
         context_text = "\n\n".join([f"[{doc.metadata.get('source_id', 'Unknown')}] {doc.page_content}" for doc in final_docs])
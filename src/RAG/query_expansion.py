@@ -0,0 +1,167 @@
+import os
+import math
+import time
+import pickle
+from collections import Counter
+import numpy as np
+
+from hybrid import tokenize
+
+# --- LOCAL QUERY EXPANSION (NO LLM CALL) ---
+# query.py used to ask GPT-4o for 3 rephrased search queries before every
+# retrieval, a full extra round-trip. LocalQueryExpander builds the extra
+# queries from the corpus itself instead, in a few milliseconds:
+#
+#   * pseudo-relevance feedback: a quick BM25 pass for the question, then
+#     the terms that stand out (tf x idf) in its top chunks
+#   * co-occurrence neighbours: for each question term, the corpus terms that
+#     appear in the same chunks far more often than chance (NPMI). The
+#     neighbour table is built once at ingest (build_expansion_vocab) over the
+#     same chunks as the BM25 index.
+#
+# expand() returns the question plus one query per source, ready for
+# multi_query_retrieve() exactly like the LLM-generated ones.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+EXPANSION_PATH = os.path.join(BASE_DIR, "data", "expansion_vocab.pkl")
+
+MIN_TERM_LEN = 3
+MIN_DF = 3                  # rarer terms are noise (typos, OCR fragments)
+MAX_DF_RATIO = 0.15         # terms in more chunks than this are too common to help
+MAX_VOCAB = 3000            # most frequent eligible terms get a neighbour list
+MIN_COOCCUR = 3
+MIN_NPMI = 0.3
+NEIGHBOURS = 5
+
+PRF_DOCS = 5
+PRF_TERMS = 6
+NEIGHBOUR_TERMS = 6
+NEIGHBOUR_SEEDS = 3         # only the question's rarest terms are expanded
+
+# Function words and question words: never expansion terms, never expanded
+STOPWORDS = frozenset("""
+a about above after again against all also although among an and any are as at be because been before
+being below between both but by can could did do does doing done during each either else etc even
+ever every few for from further had has have having here how however if in into is it its itself
+just least less like made main make many may might more most much must neither no nor not now of
+off often on once one only or other others our out over own per perhaps rather same several shall
+should since so some such than that the their them then there these they this those though three
+through thus to too two under until up upon us use used uses using very via was we were what when
+where whether which while who whom whose why will with within without would yet you your
+according compare describe discuss explain find identify list paper papers propose say says
+specific specifically
+""".split())
+
+
+def eligible_term(term):
+    # Informative enough to expand, or to count towards vocabulary coverage
+    return len(term) >= MIN_TERM_LEN and not term.isdigit() and term not in STOPWORDS
+
+
+def build_expansion_vocab(bm25_index, path=EXPANSION_PATH):
+    # term -> [(neighbour, npmi)], from chunk-level co-occurrence
+    docs = [set(tokenize(text)) for text in bm25_index.texts]
+    n = len(docs)
+    df = Counter(term for doc in docs for term in doc)
+    eligible = [t for t, c in df.items() if eligible_term(t) and MIN_DF <= c <= MAX_DF_RATIO * n]
+    vocab = sorted(eligible, key=lambda t: (-df[t], t))[:MAX_VOCAB]
+    column = {term: i for i, term in enumerate(vocab)}
+
+    occurs = np.zeros((n, len(vocab)), dtype="float32")
+    for row, doc in enumerate(docs):
+        occurs[row, [column[t] for t in doc if t in column]] = 1.0
+    cooccur = occurs.T @ occurs                      # chunks containing both terms
+
+    # NPMI = log(p(a,b) / p(a)p(b)) / -log p(a,b), in [-1, 1]
+    p_joint = cooccur / max(n, 1)
+    p_term = np.diag(p_joint)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        npmi = np.log(p_joint / np.outer(p_term, p_term)) / -np.log(p_joint)
+    npmi = np.nan_to_num(npmi, nan=-1.0, posinf=-1.0, neginf=-1.0)
+    npmi[cooccur < MIN_COOCCUR] = -1.0
+    np.fill_diagonal(npmi, -1.0)
+
+    neighbours = {}
+    for i, term in enumerate(vocab):
+        top = np.argsort(-npmi[i], kind="stable")[:NEIGHBOURS]
+        keep = [(vocab[j], round(float(npmi[i, j]), 3)) for j in top if npmi[i, j] >= MIN_NPMI]
+        if keep:
+            neighbours[term] = keep
+
+    vocab_data = {"neighbours": neighbours, "chunks": n}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(vocab_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return vocab_data
+
+
+def load_expansion_vocab(path=EXPANSION_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"⚠️ Warning: Could not load expansion vocabulary ({e}). Using feedback terms only.")
+        return None
+
+
+class LocalQueryExpander:
+    def __init__(self, bm25_index, vocab=None):
+        self.bm25_index = bm25_index
+        self.neighbours = (vocab or {}).get("neighbours", {})
+        # Okapi idf of a term in MAX_DF_RATIO of the chunks; anything commoner is skipped
+        self.min_idf = math.log((1 - MAX_DF_RATIO) / MAX_DF_RATIO)
+
+    def _idf(self, term):
+        if not self.bm25_index or not self.bm25_index.bm25:
+            return 0.0
+        return self.bm25_index.bm25.idf.get(term, 0.0)
+
+    def feedback_terms(self, question, query_terms):
+        # Top tf-idf terms of the first-pass BM25 hits (weighted by how well
+        # each hit matched), minus the question's own terms
+        if not self.bm25_index:
+            return []
+        hits = self.bm25_index.search(question, k=PRF_DOCS)
+        if not hits:
+            return []
+        best = hits[0][1]
+        weights = Counter()
+        for doc, score in hits:
+            tokens = tokenize(doc.page_content)
+            for term, tf in Counter(tokens).items():
+                if term in query_terms or not eligible_term(term):
+                    continue
+                idf = self._idf(term)
+                if idf >= self.min_idf:
+                    weights[term] += score / best * tf / len(tokens) * idf
+        return [term for term, _ in weights.most_common(PRF_TERMS)]
+
+    def neighbour_terms(self, query_terms):
+        # Neighbours of the question's rarest (most specific) terms; a term
+        # related to several of them outranks one related to a single term
+        seeds = sorted((t for t in query_terms if eligible_term(t) and t in self.neighbours),
+                       key=lambda t: (-self._idf(t), t))[:NEIGHBOUR_SEEDS]
+        scores = Counter()
+        for term in seeds:
+            for neighbour, npmi in self.neighbours[term]:
+                if neighbour not in query_terms and eligible_term(neighbour):
+                    scores[neighbour] += npmi
+        return [term for term, _ in scores.most_common(NEIGHBOUR_TERMS)]
+
+    def expand(self, question):
+        # Returns (search queries, info). The original question always comes first.
+        start = time.perf_counter()
+        query_terms = set(tokenize(question))
+        feedback = self.feedback_terms(question, query_terms)
+        related = self.neighbour_terms(query_terms)
+
+        queries = [question]
+        for terms in (feedback, related):
+            if terms:
+                queries.append(f"{question} {' '.join(terms)}")
+        info = {"feedback_terms": feedback, "neighbour_terms": related,
+                "seconds": round(time.perf_counter() - start, 4)}
+        return queries, info
@@ -1,24 +1,12 @@
-import os
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from dotenv import load_dotenv
+from dedupe import dedupe_documents
+from service import get_service
 
-load_dotenv()
-
-# Paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
-
-# 1. Setup Database Connection
-vector_store = Chroma(
-    persist_directory=DB_PATH, 
-    embedding_function=OpenAIEmbeddings()
-)
-retriever = vector_store.as_retriever(search_kwargs={"k": 5}) # Get top 5 chunks
-
-# 2. Setup LLM 
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+# 1 & 2. Database connection and LLM come from the shared, lazily built
+# service; nothing is loaded until the first query
+def get_retriever():
+    service = get_service()
+    return service.component("retriever_top5", lambda: service.hybrid_retriever(k=5)) # Get top 5 chunks
 
 
 PROMPT_TEMPLATE = """
@@ -44,22 +32,33 @@ OUTPUT FORMAT (JSON):
 
 prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
 
+def format_context(docs):
+    return "\n\n".join([
+        f"[{doc.metadata['source_id']}] {doc.page_content}" 
+        for doc in docs
+    ])
+
 def query_rag(question):
     # A. Retrieve
-    docs = retriever.invoke(question)
+    docs = dedupe_documents(get_retriever().invoke(question))
     
     # B. Format Context
-    context_text = "\n\n".join([
-        f"[{doc.metadata['source_id']}] {doc.page_content}" 
-        for doc in docs
-    ])
+    context_text = format_context(docs)
     
     # C. Generate Answer
-    chain = prompt | llm
+    chain = prompt | get_service().llm
     response = chain.invoke({"context": context_text, "question": question})
     
     return response.content, docs
 
+async def aquery_rag(question):
+    # Awaitable query_rag() (search in a worker thread, generation on the
+    # service's shared async HTTP pool), for running many questions at once
+    docs = dedupe_documents(await get_retriever().ainvoke(question))
+    chain = prompt | get_service().llm
+    response = await chain.ainvoke({"context": format_context(docs), "question": question})
+    return response.content, docs
+
 if __name__ == "__main__":
     q = input("🔎 Enter a research question: ")
     answer, sources = query_rag(q)
@@ -0,0 +1,72 @@
+import time
+import numpy as np
+
+# --- CROSS-ENCODER RERANKING ---
+# Optional stage between retrieval and the prompt: retrieve a wider candidate
+# set, score every (question, chunk) pair with a small cross-encoder on CPU,
+# and keep only the best few. Fewer, better chunks = fewer context tokens =
+# faster, cheaper generation.
+#
+# Batching is dynamic: a batch closes once it hits MAX_BATCH_CHARS (short
+# chunks -> big batches, long chunks -> small ones). Batches follow the
+# retrieval order, so when the latency budget stops scoring between batches
+# it is the best-ranked candidates that got scored; anything unscored keeps
+# its retrieval order behind them. (Chunks are all ~1000 chars, so sorting
+# by length to save padding would buy little and score the wrong ones first.)
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+MAX_BATCH_SIZE = 32
+MAX_BATCH_CHARS = 24_000
+MAX_PAIR_CHARS = 2_000      # the model truncates at 512 tokens anyway
+
+
+def dynamic_batches(lengths, max_batch_size=MAX_BATCH_SIZE, max_batch_chars=MAX_BATCH_CHARS):
+    # Yields lists of indices, in input order
+    batch, chars = [], 0
+    for i in range(len(lengths)):
+        if batch and (len(batch) >= max_batch_size or chars + lengths[i] > max_batch_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(i)
+        chars += lengths[i]
+    if batch:
+        yield batch
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name=RERANK_MODEL, max_batch_size=MAX_BATCH_SIZE, max_batch_chars=MAX_BATCH_CHARS):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+
+    def rerank(self, query, docs, top_n=6, budget_seconds=None):
+        # Returns (docs, timings). timings: seconds spent scoring, batches run,
+        # pairs scored, and whether the budget cut scoring short.
+        start = time.perf_counter()
+        pairs = [(query, doc.page_content[:MAX_PAIR_CHARS]) for doc in docs]
+        lengths = [len(q) + len(text) for q, text in pairs]
+
+        scores = np.full(len(docs), -np.inf)
+        batches = 0
+        cut_short = False
+        for batch in dynamic_batches(lengths, self.max_batch_size, self.max_batch_chars):
+            if budget_seconds is not None and time.perf_counter() - start > budget_seconds:
+                cut_short = True
+                break
+            scores[batch] = self.model.predict([pairs[i] for i in batch], batch_size=len(batch),
+                                               show_progress_bar=False)
+            batches += 1
+
+        # Scored chunks by score, then unscored ones in retrieval order
+        scored = [i for i in np.argsort(-scores, kind="stable") if np.isfinite(scores[i])]
+        unscored = [i for i in range(len(docs)) if not np.isfinite(scores[i])]
+        order = (scored + unscored)[:top_n]
+
+        timings = {
+            "rerank": round(time.perf_counter() - start, 4),
+            "rerank_batches": batches,
+            "rerank_scored": len(scored),
+            "rerank_cut_short": cut_short,
+        }
+        return [docs[i] for i in order], timings
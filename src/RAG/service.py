@@ -0,0 +1,528 @@
+import os
+import time
+import asyncio
+import threading
+import httpx
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate
+
+from embedding_cache import CachedEmbeddings
+from dedupe import dedupe_documents
+from citations import load_citation_table, citation_map
+from hybrid import HybridRetriever, load_bm25_index, reciprocal_rank_fusion
+from query_expansion import LocalQueryExpander, load_expansion_vocab
+from vector_index import VECTOR_BACKEND, make_retriever, stored_vectors
+from rerank import CrossEncoderReranker
+from context_packer import pack_context
+from streaming import AnswerStreamer
+from answer_parser import AnswerParser, llm_error
+from llm_cache import make_llm_cache, stream_with_cache
+from parents import ParentStore, expand_to_parents
+from entity_match import PaperMatcher, source_filter
+from confidence_gate import ConfidenceGate, gate_features, INSUFFICIENT_MESSAGE
+from answer_cache import SemanticAnswerCache, index_version, DEFAULT_THRESHOLD
+
+load_dotenv()
+
+# --- LAZY RAG SERVICE ---
+# One object owns the embedder, Chroma client, retriever, LLM and citation
+# map. Nothing is built at import time: each component is created on first
+# use (or by an explicit warm_up()), and get_service() hands every caller
+# in the process - eval.py, app.py sessions, rag.py - the same instance.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
+MANIFEST_PATH = os.path.join(BASE_DIR, "data", "data_manifest.csv")
+CITATIONS_PATH = os.path.join(BASE_DIR, "data", "citations.json")
+STATE_PATH = os.path.join(BASE_DIR, "data", "ingest_state.json")
+
+# Warm-up slower than this gets flagged (seconds)
+COLD_START_BUDGET = 5.0
+
+# MMR candidate pool; the vectorized selection in mmr.py keeps this cheap
+MMR_FETCH_K = 100
+
+# Paraphrases at or above this cosine similarity (and naming the same papers)
+# reuse a cached answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", DEFAULT_THRESHOLD))
+LLM_MODEL = "gpt-4o"
+
+# Optional cross-encoder rerank (RAG_RERANK=1): retrieve RERANK_CANDIDATES,
+# send only the best RERANK_TOP_N to the LLM, stop scoring after RERANK_BUDGET s
+RERANK_ENABLED = os.getenv("RAG_RERANK", "0") == "1"
+RERANK_CANDIDATES = 30
+RERANK_TOP_N = 6
+RERANK_BUDGET = 1.0
+
+# Questions that name a paper ("the Cheetah paper", "Conneau (2020)") also
+# search just that paper (ENTITY_K_PER_PAPER chunks per named paper); the
+# results are fused with the whole-corpus search, so "compare X with Y" or
+# "X and any other paper" still sees the papers the matcher didn't name
+ENTITY_FILTER_ENABLED = os.getenv("RAG_ENTITY_FILTER", "1") == "1"
+ENTITY_K_PER_PAPER = 6
+
+# Small-to-big (RAG_SMALL_TO_BIG=1, pairs with `ingest.py --small-to-big`):
+# search chunks, then hand the LLM the top PARENT_LIMIT pages they came from
+SMALL_TO_BIG = os.getenv("RAG_SMALL_TO_BIG", "0") == "1"
+PARENT_LIMIT = 4
+
+# Most context tokens sent to the LLM per question (see context_packer.py)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+
+# Answer "Insufficient Evidence" without calling the LLM when retrieval finds
+# nothing close to the question (RAG_CONFIDENCE_GATE=0 to disable). Only
+# active once src/eval/calibrate_gate.py has written data/confidence_gate.json
+CONFIDENCE_GATE_ENABLED = os.getenv("RAG_CONFIDENCE_GATE", "1") == "1"
+
+# One connection pool for every OpenAI call in the process (chat + embeddings,
+# sync + async), so concurrent queries reuse warm TLS connections
+HTTP_MAX_CONNECTIONS = int(os.getenv("RAG_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT = 60.0
+
+PROMPT_TEMPLATE = """
+You are a Research Assistant. Use ONLY the provided context to answer the question.
+
+CONTEXT:
+{context}
+
+QUESTION:
+{question}
+
+INSTRUCTIONS:
+1. Answer clearly and concisely.
+2. If the context has no answer, say "Insufficient Evidence".
+3. Cite your sources using the [source_id] found in the context (e.g., [source_05]).
+4. If the context has multiple sources, cite the relevant ones.
+
+OUTPUT FORMAT (JSON):
+{{
+  "answer": "Your answer...",
+  "citations": ["source_01", "source_05"]
+}}
+"""
+
+
+class RAGService:
+    def __init__(self, db_path=DB_PATH, citations_path=CITATIONS_PATH,
+                 manifest_path=MANIFEST_PATH, cold_start_budget=COLD_START_BUDGET, rerank=RERANK_ENABLED):
+        self.db_path = db_path
+        self.rerank = rerank
+        self.citations_path = citations_path
+        self.manifest_path = manifest_path
+        self.cold_start_budget = cold_start_budget
+        self.timings = {}          # component -> seconds it took to build
+        self._components = {}
+        self._state_mtime = None
+        self._index_version = None
+        self._lock = threading.RLock()
+
+    def component(self, name, factory):
+        # Double-checked so concurrent Streamlit sessions build each piece once
+        if name not in self._components:
+            with self._lock:
+                if name not in self._components:
+                    start = time.perf_counter()
+                    self._components[name] = factory()
+                    self.timings[name] = round(time.perf_counter() - start, 3)
+        return self._components[name]
+
+    # --- Components (built on first access) ---
+    @property
+    def embeddings(self):
+        return self.component("embeddings", lambda: CachedEmbeddings(OpenAIEmbeddings(
+            http_client=self.http_client, http_async_client=self.http_async_client)))
+
+    @property
+    def http_client(self):
+        return self.component("http_client", lambda: httpx.Client(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS), timeout=HTTP_TIMEOUT))
+
+    @property
+    def http_async_client(self):
+        # Pools are tied to the event loop that first uses them: drive
+        # arun_query() from one long-lived loop, not a new asyncio.run() each time
+        return self.component("http_async_client", lambda: httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS), timeout=HTTP_TIMEOUT))
+
+    @property
+    def vector_store(self):
+        return self.component("vector_store", lambda: Chroma(
+            persist_directory=self.db_path, embedding_function=self.embeddings))
+
+    @property
+    def bm25_index(self):
+        return self.component("bm25_index", load_bm25_index)
+
+    @property
+    def query_expander(self):
+        # Zero-LLM query expansion for query.py (RAG_QUERY_EXPANSION=local)
+        return self.component("query_expander", lambda: LocalQueryExpander(self.bm25_index, load_expansion_vocab()))
+
+    @property
+    def retriever(self):
+        # MMR dense search fused with BM25 (falls back to dense-only if the
+        # BM25 index hasn't been built). With reranking on, a wider pool.
+        return self.component("retriever", lambda: self.hybrid_retriever(k=self.retriever_k, search_type="mmr",
+                                                                          fetch_k=MMR_FETCH_K, lambda_mult=0.7))
+
+    @property
+    def retriever_k(self):
+        return RERANK_CANDIDATES if self.rerank else 12
+
+    def paper_retriever(self, source_ids):
+        # Same search as self.retriever, restricted to the named papers
+        k = min(self.retriever_k, ENTITY_K_PER_PAPER * len(source_ids))
+        return self.hybrid_retriever(k=k, search_type="mmr", fetch_k=MMR_FETCH_K, lambda_mult=0.7,
+                                     filter=source_filter(source_ids))
+
+    def hybrid_retriever(self, k, search_type="similarity", **search_kwargs):
+        return HybridRetriever(
+            # Chroma or FAISS, depending on RAG_VECTOR_BACKEND (see vector_index.py)
+            dense_retriever=make_retriever(
+                self.embeddings, k, search_type,
+                vector_store=self.vector_store if VECTOR_BACKEND == "chroma" else None, **search_kwargs),
+            bm25_index=self.bm25_index,
+            k=k,
+        )
+
+    @property
+    def parent_store(self):
+        return self.component("parent_store", ParentStore)
+
+    @property
+    def reranker(self):
+        return self.component("reranker", CrossEncoderReranker)
+
+    @property
+    def llm(self):
+        return self.component("llm", lambda: ChatOpenAI(
+            model=LLM_MODEL, temperature=0, http_client=self.http_client, http_async_client=self.http_async_client,
+            cache=self.llm_cache))
+
+    @property
+    def llm_cache(self):
+        # Exact-prompt response cache (RAG_LLM_CACHE=on|replay|off, see llm_cache.py)
+        return self.component("llm_cache", make_llm_cache)
+
+    @property
+    def prompt(self):
+        return self.component("prompt", lambda: ChatPromptTemplate.from_template(PROMPT_TEMPLATE))
+
+    @property
+    def citation_table(self):
+        return self.component("citation_table", lambda: load_citation_table(self.citations_path, self.manifest_path))
+
+    @property
+    def citation_map(self):
+        return self.component("citation_map", lambda: citation_map(self.citation_table))
+
+    @property
+    def answer_parser(self):
+        return self.component("answer_parser", lambda: AnswerParser(self.citation_map))
+
+    @property
+    def confidence_gate(self):
+        # None (gate off) when disabled or not calibrated yet
+        return self.component("confidence_gate", lambda: ConfidenceGate.load() if CONFIDENCE_GATE_ENABLED else None)
+
+    @property
+    def paper_matcher(self):
+        return self.component("paper_matcher", lambda: PaperMatcher(self.citation_table))
+
+    @property
+    def answer_cache(self):
+        return self.component("answer_cache", lambda: SemanticAnswerCache(
+            version=self.index_version(), threshold=ANSWER_CACHE_THRESHOLD))
+
+    def index_version(self):
+        # Re-hashed only when ingest_state.json changes on disk; also covers
+        # anything else a cached answer depends on
+        mtime = os.path.getmtime(STATE_PATH) if os.path.exists(STATE_PATH) else None
+        if self._index_version is None or mtime != self._state_mtime:
+            self._state_mtime = mtime
+            config = (f"{VECTOR_BACKEND}|{LLM_MODEL}|rerank={self.rerank}|entity={ENTITY_FILTER_ENABLED}"
+                      f"|small_to_big={SMALL_TO_BIG}|context={CONTEXT_TOKEN_BUDGET}"
+                      f"|gate={self.confidence_gate.describe() if self.confidence_gate else None}")
+            self._index_version = index_version(STATE_PATH, extra=f"{config}|{PROMPT_TEMPLATE}")
+        return self._index_version
+
+    def warm_up(self, probe=False):
+        # Build everything up front (e.g. once per Streamlit process) and
+        # report where the cold-start time went. probe=True also runs one
+        # search so Chroma pages its index in.
+        start = time.perf_counter()
+        for name in ("embeddings", "vector_store", "bm25_index", "retriever", "llm", "prompt", "citation_map",
+                     "paper_matcher", "confidence_gate", "answer_cache"):
+            getattr(self, name)
+        if self.rerank:
+            self.reranker
+        if probe:
+            probe_start = time.perf_counter()
+            self.vector_store.similarity_search("warm up", k=1)
+            self.timings["probe"] = round(time.perf_counter() - probe_start, 3)
+        total = round(time.perf_counter() - start, 3)
+
+        report = {"components": dict(self.timings), "total": total,
+                  "budget": self.cold_start_budget, "within_budget": total <= self.cold_start_budget}
+        if not report["within_budget"]:
+            print(f"⚠️ Cold start took {total}s (budget {self.cold_start_budget}s): {self.timings}")
+        return report
+
+    # --- Query ---
+    def retrieve(self, question):
+        # Returns (docs, timings, matched source_ids). A question that names
+        # papers gets their chunks fused (RRF) with the whole-corpus results:
+        # the named papers come first without shutting out the rest.
+        docs, timings = self.retriever.retrieve_with_timings(question)
+        if not ENTITY_FILTER_ENABLED:
+            return docs, timings, []
+
+        start = time.perf_counter()
+        matched = self.paper_matcher.match(question)
+        timings["entity_match"] = round(time.perf_counter() - start, 4)
+        if not matched:
+            return docs, timings, []
+
+        paper_docs, paper_timings = self.paper_retriever(matched).retrieve_with_timings(question)
+        start = time.perf_counter()
+        docs = reciprocal_rank_fusion([paper_docs, docs], limit=self.retriever_k)
+        timings["entity_fusion"] = round(time.perf_counter() - start, 4)
+        timings.update({f"paper_{name}": seconds for name, seconds in paper_timings.items()})
+        return docs, timings, matched
+
+    def gate_features(self, question, docs):
+        # Retrieval-confidence signals for the gate (see confidence_gate.py).
+        # The question vector is the one retrieval just embedded (cached); the
+        # chunk vectors are read back from the vector index by id
+        stored = stored_vectors([doc.id for doc in docs],
+                                vector_store=self.vector_store if VECTOR_BACKEND == "chroma" else None)
+        return gate_features(question, self.embeddings.embed_query(question), docs,
+                             self.embeddings, self.bm25_index, stored)
+
+    def run_query(self, question, use_cache=True):
+        # Blocking version of stream_query(): returns the final result dict.
+        # use_cache=False always goes to the LLM (eval runs, debugging)
+        result = None
+        for event in self.stream_query(question, use_cache=use_cache):
+            if event["type"] == "done":
+                result = event["result"]
+        return result
+
+    def stream_query(self, question, use_cache=True):
+        # Yields, in order:
+        #   {"type": "sources", "chunks": [...], ...}   as soon as retrieval is done
+        #   {"type": "token", "text": "..."}            answer text as it is generated
+        #   {"type": "done", "result": {...}}           same dict run_query returns
+        start_time = time.time()
+
+        if use_cache:
+            question_vector = self.embeddings.embed_query(question)
+            hit = self._cache_hit(question, question_vector, start_time)
+            if hit:
+                yield {"type": "sources", "chunks": hit["retrieved_chunks"],
+                       "matched_sources": hit.get("matched_sources", [])}
+                yield {"type": "token", "text": hit["answer"]}
+                yield {"type": "done", "result": hit}
+                return
+
+        print(f"\n🔵 Query: {question}")
+        context = self._build_context(question)
+        context_text, retrieved_chunks_log, matched_sources, retrieval_timings, context_stats, gate = context
+        yield {"type": "sources", "chunks": retrieved_chunks_log, "matched_sources": matched_sources,
+               "retrieval_timings": retrieval_timings, "context_tokens": context_stats}
+
+        # 3. Generate (streamed; the full completion is parsed once it is in)
+        streamer = AnswerStreamer(self.citation_map)
+        parts = []
+        ttft = None
+        if gate and not gate["passed"]:
+            parsed = gated_answer()
+            ttft = time.time() - start_time
+            yield {"type": "token", "text": parsed["answer"]}
+            result = self._finish(question, parsed, context, ttft, start_time)
+            if use_cache:
+                result = self._cache_put(question, question_vector, result)
+            yield {"type": "done", "result": result}
+            return
+        try:
+            prompt_value = self.prompt.invoke({"context": context_text, "question": question})
+            for chunk in stream_with_cache(self.llm, prompt_value):
+                parts.append(chunk.content)
+                text = streamer.feed(chunk.content)
+                if text:
+                    if ttft is None:
+                        ttft = time.time() - start_time
+                    yield {"type": "token", "text": text}
+            text = streamer.flush()
+            if text:
+                yield {"type": "token", "text": text}
+            parsed = self.answer_parser.parse("".join(parts))
+        except Exception as e:
+            parsed = llm_error(e)
+
+        result = self._finish(question, parsed, context, ttft, start_time)
+        if use_cache:
+            result = self._cache_put(question, question_vector, result)
+        yield {"type": "done", "result": result}
+
+    async def arun_query(self, question, use_cache=True, raise_errors=False):
+        # asyncio version of run_query() for serving many questions from one
+        # process (e.g. asyncio.gather over a batch). Embedding and generation
+        # are awaited on the shared HTTP pool; the local vector/BM25 search
+        # runs in a worker thread so it never blocks the event loop. The
+        # question is retrieved exactly once. raise_errors=True lets LLM errors
+        # (e.g. 429s) propagate instead of becoming an "Error: ..." answer.
+        start_time = time.time()
+
+        # Embedding first also primes the embedding cache, so the search
+        # below doesn't go back to the API for the same vector
+        question_vector = await self.embeddings.aembed_query(question)
+        if use_cache:
+            hit = self._cache_hit(question, question_vector, start_time)
+            if hit:
+                return hit
+
+        print(f"\n🔵 Query: {question}")
+        context = await asyncio.to_thread(self._build_context, question)
+        context_text, gate = context[0], context[-1]
+
+        chain = self.prompt | self.llm
+        try:
+            if gate and not gate["passed"]:
+                parsed = gated_answer()
+            else:
+                response = await chain.ainvoke({"context": context_text, "question": question})
+                parsed = self.answer_parser.parse(response.content)
+        except Exception as e:
+            if raise_errors:
+                raise      # the parser itself doesn't raise, so this is the API call failing
+            parsed = llm_error(e)
+
+        # Not streamed: the whole answer arrives at once
+        result = self._finish(question, parsed, context,
+                              time.time() - start_time, start_time)
+        if use_cache:
+            result = self._cache_put(question, question_vector, result)
+        return result
+
+    def _cache_hit(self, question, question_vector, start_time):
+        # The stored result for a close-enough paraphrase naming the same papers, or None
+        cache = self.answer_cache
+        cache.set_version(self.index_version())
+        cached = cache.lookup(question_vector, entities=self.paper_matcher.match(question))
+        if not cached:
+            return None
+        result, similarity, matched_question = cached
+        print(f"\n⚡ Cache hit ({similarity}): '{question}' ~ '{matched_question}'")
+        elapsed = round(time.time() - start_time, 2)
+        return {**result, "question": question, "ttft": elapsed, "time_taken": elapsed,
+                "cache": {"hit": True, "similarity": similarity, "matched_question": matched_question}}
+
+    def _cache_put(self, question, question_vector, result):
+        if not result["answer"].startswith("Error:"):
+            self.answer_cache.put(question, question_vector, result, result["time_taken"],
+                                  entities=self.paper_matcher.match(question))
+        return {**result, "cache": {"hit": False}}
+
+    def _finish(self, question, parsed, context, ttft, start_time):
+        # Logs the answer and builds the result dict
+        _, retrieved_chunks_log, matched_sources, retrieval_timings, context_stats, gate = context
+        answer, readable_citations = parsed["answer"], parsed["citations_readable"]
+        elapsed = time.time() - start_time
+
+        # Print to Terminal
+        print(f"🟢 Answer: {answer}")
+        if readable_citations:
+            print(f"📚 Sources: {', '.join(readable_citations)}")
+        else:
+            print("📚 Sources: None")
+        print(f"⏱️  First token {round(ttft, 2) if ttft is not None else '-'}s, total {round(elapsed, 2)}s")
+        print("-" * 60)
+
+        return {
+            "question": question,
+            "answer": answer,
+            "citations_readable": readable_citations,
+            "citations_raw": parsed["citations_raw"],
+            "parse_status": parsed["status"],
+            "insufficient_evidence": parsed["insufficient"],
+            "gate": gate,
+            "retrieved_chunks": retrieved_chunks_log,
+            "matched_sources": matched_sources,
+            "retrieval_timings": retrieval_timings,
+            "context_tokens": context_stats,
+            "ttft": round(ttft, 2) if ttft is not None else None,
+            "time_taken": round(elapsed, 2)
+        }
+
+    def _build_context(self, question):
+        # Retrieval through context packing. Returns (context_text, chunk log,
+        # matched source_ids, retrieval timings, context token stats, gate).
+        # gate is None with the gate off, else {"passed", "features", "reasons"}
+        source_id_to_citation = self.citation_map
+
+        # 1. Retrieve (and drop near-identical chunks so each one adds new evidence)
+        docs, retrieval_timings, matched_sources = self.retrieve(question)
+        docs = dedupe_documents(docs)
+
+        # 1b. Confidence gate: a failed check skips reranking and the LLM call
+        gate = None
+        if self.confidence_gate:
+            start = time.perf_counter()
+            features = self.gate_features(question, docs)
+            passed, reasons = self.confidence_gate.check(features)
+            gate = {"passed": passed, "features": features, "reasons": reasons}
+            retrieval_timings["gate"] = round(time.perf_counter() - start, 4)
+            if not passed:
+                print(f"   🚧 Confidence gate: {'; '.join(reasons)}")
+                if features["missing_terms"]:
+                    print(f"   🚧 Not in corpus: {', '.join(features['missing_terms'])}")
+
+        if self.rerank and (gate is None or gate["passed"]):
+            docs, rerank_timings = self.reranker.rerank(question, docs, top_n=RERANK_TOP_N,
+                                                        budget_seconds=RERANK_BUDGET)
+            retrieval_timings.update(rerank_timings)
+        if SMALL_TO_BIG and (gate is None or gate["passed"]):
+            start = time.perf_counter()
+            docs = expand_to_parents(docs, self.parent_store, max_parents=PARENT_LIMIT)
+            retrieval_timings["parents"] = round(time.perf_counter() - start, 4)
+
+        # 2. Pack Context (token budget, overlapping neighbours stitched) & Log Chunks
+        context_text, docs, context_stats = pack_context(docs, CONTEXT_TOKEN_BUDGET, LLM_MODEL)
+        print(f"   🧮 Context: {context_stats['tokens']}/{context_stats['budget']} tokens, "
+              f"{context_stats['blocks_sent']} blocks ({context_stats['merged']} merged, "
+              f"{context_stats['dropped']} dropped)")
+        retrieved_chunks_log = []
+
+        for doc in docs:
+            s_id = doc.metadata.get('source_id', 'Unknown')
+            content = doc.page_content
+
+            retrieved_chunks_log.append({
+                "source_id": s_id,
+                "citation": source_id_to_citation.get(s_id, "Unknown"),
+                "text_snippet": content
+            })
+
+        return context_text, retrieved_chunks_log, matched_sources, retrieval_timings, context_stats, gate
+
+
+def gated_answer():
+    # Parsed-answer shape for a question the confidence gate turned away
+    return {"answer": INSUFFICIENT_MESSAGE, "citations_raw": [], "citations_readable": [],
+            "status": "gated", "insufficient": True}
+
+
+# --- PROCESS-WIDE INSTANCE ---
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RAGService()
+    return _service
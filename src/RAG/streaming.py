@@ -0,0 +1,94 @@
+import re
+from answer_parser import CitationRewriter, decode_json_string, MAX_MARKER_LEN
+
+# --- STREAMED ANSWERS ---
+# The prompt asks GPT-4o for {"answer": "...", "citations": [...]}, which can
+# only be json.loads()-ed once the whole completion is in. To show the answer
+# while it is being written, AnswerStreamer pulls the "answer" string out of
+# the partial JSON as tokens arrive (decoding escapes as it goes) and swaps
+# [source_xx] markers for readable citations as soon as the closing bracket
+# shows up. The full completion is still parsed at the end for the citation list.
+
+_ANSWER_KEY_RE = re.compile(r'"answer"\s*:\s*"')
+_MAX_MARKER = MAX_MARKER_LEN + 2   # longest "[...]" we hold back waiting for its "]"
+
+
+def _after_fence(raw):
+    # Text after an opening ``` / ```json fence; "" while the fence itself is still arriving
+    body = raw.lstrip()
+    if "```json".startswith(body):
+        return ""
+    if body.startswith("```"):
+        body = body[3:]
+        body = body[4:] if body.startswith("json") else body
+    return body.lstrip()
+
+
+class JSONAnswerStream:
+    # Feed raw completion deltas, get back newly decoded text of the "answer" field.
+    # If the model answers in plain text instead of JSON, that text is passed through.
+    def __init__(self):
+        self.raw = ""
+        self.pos = 0
+        self.state = "seek"     # seek -> string -> done, or plain
+
+    def feed(self, delta):
+        self.raw += delta
+        if self.state == "seek":
+            match = _ANSWER_KEY_RE.search(self.raw)
+            body = _after_fence(self.raw)
+            if match:
+                self.state, self.pos = "string", match.end()
+            elif body and not body.startswith("{"):
+                self.state = "plain"
+            else:
+                return ""
+        if self.state == "plain":
+            out = self.raw[self.pos:].replace("```json", "").replace("```", "")
+            self.pos = len(self.raw)
+            return out
+        if self.state == "string":
+            return self._decode()
+        return ""
+
+    def _decode(self):
+        text, self.pos, closed = decode_json_string(self.raw, self.pos)
+        if closed:
+            self.state = "done"
+        return text
+
+
+class CitationStream:
+    # Replaces [source_xx] with (readable citation) in streamed text, holding
+    # back a possibly unfinished "[..." until it is complete
+    def __init__(self, citation_map):
+        self.rewriter = CitationRewriter(citation_map)
+        self.pending = ""
+
+    def _replace(self, text):
+        return self.rewriter.rewrite(text)
+
+    def feed(self, text):
+        text = self.pending + text
+        cut = text.rfind("[")
+        if cut != -1 and "]" not in text[cut:] and len(text) - cut < _MAX_MARKER:
+            text, self.pending = text[:cut], text[cut:]
+        else:
+            self.pending = ""
+        return self._replace(text)
+
+    def flush(self):
+        text, self.pending = self.pending, ""
+        return self._replace(text)
+
+
+class AnswerStreamer:
+    def __init__(self, citation_map):
+        self.answer = JSONAnswerStream()
+        self.citations = CitationStream(citation_map)
+
+    def feed(self, delta):
+        return self.citations.feed(self.answer.feed(delta))
+
+    def flush(self):
+        return self.citations.flush()
@@ -0,0 +1,216 @@
+import os
+import pickle
+import threading
+import numpy as np
+from typing import Any, Dict, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from mmr import ChromaMMRRetriever, mmr_select
+
+# --- PLUGGABLE VECTOR INDEX ---
+# Every query path gets its dense retriever from make_retriever(), so the
+# backend is a config switch instead of a hard-wired Chroma(...) call:
+#
+#   RAG_VECTOR_BACKEND=chroma      (default) the persisted Chroma collection
+#   RAG_VECTOR_BACKEND=faiss-flat  exact search
+#   RAG_VECTOR_BACKEND=faiss-ivf   inverted lists (nprobe trades recall for speed)
+#   RAG_VECTOR_BACKEND=faiss-hnsw  graph search (efSearch trades recall for speed)
+#   RAG_VECTOR_BACKEND=faiss-int8  8-bit scalar-quantized codes (4x less RAM)
+#   RAG_VECTOR_BACKEND=faiss-binary 1 bit per dimension (32x less RAM)
+#
+# FAISS files are produced from the Chroma collection by
+# src/ingest/build_faiss.py and are memory-mapped on load.
+#
+# The quantized kinds search their compact codes for RESCORE_FACTOR[kind] * k
+# candidates, then rescore those with exact L2 on the float32 rows of the
+# memory-mapped vectors.npy, so only the candidates' full vectors are ever
+# paged in.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FAISS_DIR = os.path.join(BASE_DIR, "data", "faiss")
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+FAISS_KINDS = ("flat", "ivf", "hnsw", "int8", "binary")
+QUANTIZED_KINDS = ("int8", "binary")
+
+# Search-time knobs
+IVF_NPROBE = 16
+HNSW_EF_SEARCH = 128
+# First-pass candidates per result to rescore; 1-bit codes need a deeper pool
+RESCORE_FACTOR = {"int8": 3, "binary": 10}
+
+
+def binary_codes(vectors):
+    # Sign bit per dimension, packed 8 per byte
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+def faiss_paths(faiss_dir, kind):
+    return {
+        "index": os.path.join(faiss_dir, f"{kind}.index"),
+        "vectors": os.path.join(faiss_dir, "vectors.npy"),
+        "docstore": os.path.join(faiss_dir, "docstore.pkl"),
+    }
+
+
+class FaissIndex:
+    def __init__(self, faiss_dir, kind):
+        import faiss
+        self.faiss = faiss
+        self.kind = kind
+        paths = faiss_paths(faiss_dir, kind)
+        read = faiss.read_index_binary if kind == "binary" else faiss.read_index
+        try:
+            self.index = read(paths["index"], faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type supports mmap; fall back to a normal load
+            self.index = read(paths["index"])
+        # Full-precision vectors stay on disk and are paged in on demand (MMR and rescoring need them)
+        self.vectors = np.load(paths["vectors"], mmap_mode="r")
+        with open(paths["docstore"], "rb") as f:
+            store = pickle.load(f)
+        self.ids = store["ids"]
+        self.texts = store["texts"]
+        self.metadatas = store["metadatas"]
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def _params(self, positions=None):
+        sel = self.faiss.IDSelectorBatch(np.asarray(positions, dtype="int64")) if positions is not None else None
+        if self.kind == "ivf":
+            return self.faiss.SearchParametersIVF(sel=sel, nprobe=IVF_NPROBE)
+        if self.kind == "hnsw":
+            return self.faiss.SearchParametersHNSW(sel=sel, efSearch=HNSW_EF_SEARCH)
+        return self.faiss.SearchParameters(sel=sel) if sel is not None else None
+
+    def allowed_positions(self, where):
+        return [i for i, meta in enumerate(self.metadatas) if matches_filter(meta, where)]
+
+    def search(self, vector, k, where=None, rescore=True):
+        # Returns [(position, l2_distance)] best first. rescore=False returns
+        # the raw first-pass ranking of a quantized index (for measuring it).
+        positions = self.allowed_positions(where) if where else None
+        if positions is not None and not positions:
+            return []
+        query = np.asarray(vector, dtype="float32").reshape(1, -1)
+        quantized = self.kind in QUANTIZED_KINDS
+        first_k = k * RESCORE_FACTOR[self.kind] if quantized and rescore else k
+        codes = binary_codes(query) if self.kind == "binary" else query
+        distances, found = self.index.search(codes, first_k, params=self._params(positions))
+        hits = [(int(i), float(d)) for i, d in zip(found[0], distances[0]) if i >= 0]
+        if not quantized or not rescore or not hits:
+            return hits
+
+        candidates = np.array([i for i, _ in hits])
+        order = np.sort(candidates)  # ascending rows read the mmap sequentially
+        exact = ((np.asarray(self.vectors[order], dtype="float32") - query) ** 2).sum(axis=1)
+        best = np.argsort(exact)[:k]
+        return [(int(order[j]), float(exact[j])) for j in best]
+
+    def memory_bytes(self):
+        # What the index itself keeps in RAM (vectors.npy is mmap'd, not counted)
+        if self.kind == "binary":
+            return self.index.ntotal * self.index.code_size
+        if self.kind in ("flat", "int8"):
+            return self.index.ntotal * self.index.sa_code_size()
+        return None
+
+    def document(self, position):
+        return Document(page_content=self.texts[position], metadata=self.metadatas[position],
+                        id=self.ids[position])
+
+
+def matches_filter(metadata, where):
+    # Chroma-style {field: value} / {field: {"$in": [...]}} filter on one metadata dict
+    for field, condition in where.items():
+        value = (metadata or {}).get(field)
+        if isinstance(condition, dict) and "$in" in condition:
+            if value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def load_faiss_index(kind, faiss_dir=FAISS_DIR):
+    # One mmap per process, however many retrievers share it
+    key = (faiss_dir, kind)
+    with _loaded_lock:
+        if key not in _loaded:
+            _loaded[key] = FaissIndex(faiss_dir, kind)
+        return _loaded[key]
+
+
+class IndexRetriever(BaseRetriever):
+    # Same contract as vector_store.as_retriever(): .invoke(question) -> docs,
+    # and search_kwargs holds k / fetch_k / lambda_mult / min_score / filter
+    index: Any
+    embeddings: Any
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = {}
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self.search_by_vector(self.embeddings.embed_query(query))
+
+    def search_by_vector(self, vector):
+        k = self.search_kwargs.get("k", 4)
+        where = self.search_kwargs.get("filter")
+        if self.search_type != "mmr":
+            return [self.index.document(i) for i, _ in self.index.search(vector, k, where=where)]
+
+        fetch_k = self.search_kwargs.get("fetch_k", 20)
+        lambda_mult = self.search_kwargs.get("lambda_mult", 0.5)
+        candidates = [i for i, _ in self.index.search(vector, fetch_k, where=where)]
+        if not candidates:
+            return []
+        candidate_vectors = np.asarray(self.index.vectors[candidates], dtype="float32")
+        picked = mmr_select(vector, candidate_vectors, k=k, lambda_mult=lambda_mult,
+                            min_score=self.search_kwargs.get("min_score"))
+        return [self.index.document(candidates[j]) for j in picked]
+
+
+def dense_search_by_vector(retriever, vector):
+    # Search with an already-computed query embedding, for any retriever
+    # make_retriever() returns (lets multi-query retrieval batch the embedding)
+    if hasattr(retriever, "search_by_vector"):
+        return retriever.search_by_vector(vector)
+    kwargs = dict(retriever.search_kwargs)
+    return retriever.vectorstore.similarity_search_by_vector(vector, k=kwargs.pop("k", 4),
+                                                             filter=kwargs.pop("filter", None))
+
+
+def stored_vectors(ids, vector_store=None, backend=None, faiss_dir=FAISS_DIR):
+    # {chunk id: stored embedding} for the ids the active backend holds, read
+    # locally (Chroma's collection or FAISS's mmap'd vectors.npy), never
+    # through the embedding API. Ids it doesn't hold are left out.
+    backend = backend or VECTOR_BACKEND
+    ids = [i for i in dict.fromkeys(ids) if i]
+    if not ids:
+        return {}
+    if backend == "chroma":
+        result = vector_store._collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(result["ids"], result["embeddings"]))
+    index = load_faiss_index(backend.split("-", 1)[-1], faiss_dir)
+    return {i: index.vectors[index.positions[i]] for i in ids if i in index.positions}
+
+
+def make_retriever(embeddings, k, search_type="similarity", backend=None, vector_store=None,
+                   faiss_dir=FAISS_DIR, **search_kwargs):
+    # The one place that knows which dense backend is in use
+    backend = backend or VECTOR_BACKEND
+    search_kwargs = {"k": k, **search_kwargs}
+    if backend == "chroma":
+        if search_type == "mmr":
+            return ChromaMMRRetriever(vector_store=vector_store, embeddings=embeddings, search_kwargs=search_kwargs)
+        return vector_store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+
+    kind = backend.split("-", 1)[-1]
+    if not backend.startswith("faiss") or kind not in FAISS_KINDS:
+        raise ValueError(f"Unknown vector backend '{backend}'. Use chroma or faiss-{{{','.join(FAISS_KINDS)}}}.")
+    return IndexRetriever(index=load_faiss_index(kind, faiss_dir), embeddings=embeddings,
+                          search_type=search_type, search_kwargs=search_kwargs)
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# Measure real GPT-4o round-trips unless told otherwise
+os.environ.setdefault("RAG_LLM_CACHE", "off")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from service import get_service
+from hybrid import multi_query_retrieve
+from dedupe import dedupe_documents
+from query import expand_queries, EXPANSION_MODES
+from eval import load_questions, OUTPUT_DIR
+
+# --- QUERY EXPANSION BENCHMARK ---
+# LLM brainstorming vs local (zero-LLM) expansion vs no expansion, on the
+# eval questions, with the same retrieval as query.py. Per mode:
+#   * expansion and retrieval latency (p50 / p99)
+#   * paper recall@k: for questions that name papers ("the AfroBench paper",
+#     "Conneau (2020)"), the share of those papers among the retrieved chunks
+#   * overlap@k with the LLM mode's chunks, to see how far local expansion
+#     lands from what the LLM queries would have found
+#
+# Usage: python src/eval/bench_expansion.py --k 5
+
+RESULTS_PATH = os.path.join(OUTPUT_DIR, "query_expansion_benchmark.json")
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 2)
+
+
+def run_benchmark(k=5, modes=EXPANSION_MODES):
+    service = get_service()
+    questions = load_questions()
+    retriever = service.hybrid_retriever(k=k)
+    matcher = service.paper_matcher
+    expected = {q: set(matcher.match(q)) for q in questions}
+
+    found = {mode: {} for mode in modes}
+    report = {"k": k, "queries": len(questions), "named_paper_queries": sum(1 for q in questions if expected[q]),
+              "modes": {}}
+    for mode in modes:
+        expand_s, retrieve_s, recalls = [], [], []
+        for question in questions:
+            start = time.perf_counter()
+            search_queries = expand_queries(service, question, mode)
+            expanded = time.perf_counter()
+            docs, _ = multi_query_retrieve(retriever, service.embeddings, search_queries)
+            docs = dedupe_documents(docs)[:k]
+            expand_s.append(expanded - start)
+            retrieve_s.append(time.perf_counter() - expanded)
+
+            found[mode][question] = [doc.id or doc.page_content for doc in docs]
+            if expected[question]:
+                sources = {doc.metadata.get("source_id") for doc in docs}
+                recalls.append(len(expected[question] & sources) / len(expected[question]))
+
+        total_s = np.add(expand_s, retrieve_s)
+        report["modes"][mode] = {
+            "expand_p50_ms": percentile_ms(expand_s, 50),
+            "expand_p99_ms": percentile_ms(expand_s, 99),
+            "retrieve_p50_ms": percentile_ms(retrieve_s, 50),
+            "total_p50_ms": percentile_ms(total_s, 50),
+            "total_p99_ms": percentile_ms(total_s, 99),
+            f"paper_recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        }
+
+    if "llm" in found:
+        for mode in modes:
+            overlaps = [len(set(found[mode][q]) & set(found["llm"][q])) / k for q in questions]
+            report["modes"][mode][f"overlap_with_llm@{k}"] = round(float(np.mean(overlaps)), 4)
+
+    for mode, row in report["modes"].items():
+        print(f"   {mode:<6} expand p50 {row['expand_p50_ms']:>9} ms   total p50 {row['total_p50_ms']:>9} ms   "
+              f"p99 {row['total_p99_ms']:>9} ms   paper recall@{k} {row[f'paper_recall@{k}']}   "
+              f"overlap w/ llm {row.get(f'overlap_with_llm@{k}', '-')}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare LLM, local and no query expansion.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=list(EXPANSION_MODES), choices=EXPANSION_MODES)
+    args = parser.parse_args()
+
+    print("⏱️  Benchmarking query expansion...")
+    report = run_benchmark(k=args.k, modes=args.modes)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Saved: {RESULTS_PATH}")
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from mmr import mmr_select
+from vector_index import FAISS_DIR, faiss_paths
+
+# --- MMR BENCHMARK ---
+# Latency of the MMR selection stage as fetch_k grows, stock LangChain
+# maximal_marginal_relevance vs our vectorized mmr_select. Candidates are real
+# chunk embeddings from data/faiss/vectors.npy when it exists (build_faiss.py),
+# otherwise random 1536-d vectors.
+#
+# Usage: python src/eval/bench_mmr.py --k 12 --lambda-mult 0.7
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULTS_PATH = os.path.join(BASE_DIR, "outputs", "mmr_benchmark.json")
+FETCH_KS = (20, 50, 100, 200, 500, 1000)
+
+
+def load_pool(size, dims=1536, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors_path = faiss_paths(FAISS_DIR, "flat")["vectors"]
+    if os.path.exists(vectors_path):
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if len(vectors) > size:
+            return np.asarray(vectors[:size + 1], dtype="float32"), "corpus"
+    return rng.standard_normal((size + 1, dims)).astype("float32"), "random"
+
+
+def time_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(float(np.median(samples)) * 1000, 3)
+
+
+def run_benchmark(k=12, lambda_mult=0.7, repeats=5, fetch_ks=FETCH_KS):
+    pool, source = load_pool(max(fetch_ks))
+    query, pool = pool[0], pool[1:]
+    print(f"⏱️  MMR selection, k={k}, lambda={lambda_mult}, {source} vectors ({pool.shape[1]} dims)")
+    print(f"   {'fetch_k':>7}  {'langchain ms':>12}  {'vectorized ms':>13}  {'speedup':>7}  same picks")
+
+    rows = []
+    for fetch_k in fetch_ks:
+        # Same candidate order as a real search: nearest first
+        order = np.argsort(((pool - query) ** 2).sum(axis=1))[:fetch_k]
+        candidates = pool[order]
+
+        stock = maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=k)
+        ours = mmr_select(query, candidates, k=k, lambda_mult=lambda_mult)
+        row = {
+            "fetch_k": fetch_k,
+            "langchain_ms": time_ms(lambda: maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=k), repeats),
+            "vectorized_ms": time_ms(lambda: mmr_select(query, candidates, k=k, lambda_mult=lambda_mult), repeats),
+            "same_picks": list(stock) == ours,
+        }
+        row["speedup"] = round(row["langchain_ms"] / max(row["vectorized_ms"], 1e-6), 1)
+        rows.append(row)
+        print(f"   {fetch_k:>7}  {row['langchain_ms']:>12}  {row['vectorized_ms']:>13}  {row['speedup']:>6}x  {row['same_picks']}")
+    return {"k": k, "lambda_mult": lambda_mult, "vectors": source, "results": rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark MMR selection latency against fetch_k.")
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--lambda-mult", type=float, default=0.7)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    report = run_benchmark(k=args.k, lambda_mult=args.lambda_mult, repeats=args.repeats)
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Saved: {RESULTS_PATH}")
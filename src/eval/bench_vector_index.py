@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from service import get_service
+from vector_index import FAISS_DIR, FAISS_KINDS, QUANTIZED_KINDS, load_faiss_index
+from eval import load_questions, OUTPUT_DIR
+
+# --- VECTOR BACKEND BENCHMARK ---
+# Head-to-head on our own corpus and eval questions: Chroma vs FAISS
+# Flat / IVF / HNSW / int8 / binary. Reports p50 / p99 search latency (query
+# embedding excluded), recall@k against exact brute-force search, and the
+# RAM each index holds. For the quantized kinds it also reports recall
+# before full-precision rescoring, i.e. the loss the rescoring wins back.
+#
+# Usage: python src/ingest/build_faiss.py && python src/eval/bench_vector_index.py --k 12
+
+RESULTS_PATH = os.path.join(OUTPUT_DIR, "vector_index_benchmark.json")
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def exact_top_k(vectors, query, k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    top = np.argpartition(distances, k - 1)[:k]
+    return set(top[np.argsort(distances[top])].tolist())
+
+
+def run_benchmark(k=12, repeats=5, faiss_dir=FAISS_DIR):
+    service = get_service()
+    questions = load_questions()
+    query_vectors = np.asarray(service.embeddings.embed_documents(questions), dtype="float32")
+
+    # Ground truth from the full-precision matrix the FAISS indexes were built from
+    flat = load_faiss_index("flat", faiss_dir)
+    all_vectors = np.asarray(flat.vectors, dtype="float32")
+    position_of = {chunk_id: i for i, chunk_id in enumerate(flat.ids)}
+    truth = [exact_top_k(all_vectors, q, k) for q in query_vectors]
+
+    collection = service.vector_store._collection
+    backends = {
+        "chroma": lambda q: [position_of.get(i, -1) for i in
+                             collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]],
+    }
+    indexes = {}
+    for kind in FAISS_KINDS:
+        index = indexes[f"faiss-{kind}"] = load_faiss_index(kind, faiss_dir)
+        backends[f"faiss-{kind}"] = lambda q, index=index: [i for i, _ in index.search(q, k)]
+        if kind in QUANTIZED_KINDS:
+            indexes[f"faiss-{kind}-raw"] = index
+            backends[f"faiss-{kind}-raw"] = lambda q, index=index: [i for i, _ in index.search(q, k, rescore=False)]
+
+    report = {"k": k, "queries": len(questions), "repeats": repeats, "chunks": len(flat), "backends": {}}
+    for name, search in backends.items():
+        search(query_vectors[0])  # warm caches / page in the mmap
+        latencies, recalls = [], []
+        for qi, q in enumerate(query_vectors):
+            for _ in range(repeats):
+                start = time.perf_counter()
+                found = search(q)
+                latencies.append(time.perf_counter() - start)
+            recalls.append(len(truth[qi] & set(found)) / k)
+        memory = indexes[name].memory_bytes() if name in indexes else None
+        row = report["backends"][name] = {
+            "p50_ms": percentile_ms(latencies, 50),
+            "p99_ms": percentile_ms(latencies, 99),
+            f"recall@{k}": round(float(np.mean(recalls)), 4),
+            "index_mb": round(memory / 1e6, 2) if memory is not None else None,
+        }
+        print(f"   {name:<18} p50 {row['p50_ms']:>8} ms   p99 {row['p99_ms']:>8} ms   "
+              f"recall@{k} {row[f'recall@{k}']:<6}   index {row['index_mb'] if memory is not None else '-'} MB")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Chroma and FAISS search latency and recall.")
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print("⏱️  Benchmarking vector backends...")
+    report = run_benchmark(k=args.k, repeats=args.repeats)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Saved: {RESULTS_PATH}")
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from service import get_service
+from dedupe import dedupe_documents
+from confidence_gate import GATE_PATH, ConfidenceGate, calibrate
+from eval import BASE_DIR, OUTPUT_DIR
+
+# --- CONFIDENCE GATE CALIBRATION ---
+# Fits the retrieval-confidence gate's thresholds on labelled questions:
+# each one is retrieved exactly as the service would (no LLM call), its gate
+# features are computed, and calibrate() picks the thresholds that turn away
+# the most unanswerable questions without turning away an answerable one
+# (or at most --max-false-rejects of them). Writes data/confidence_gate.json,
+# which switches the gate on for the service.
+#
+# Re-run after re-ingesting: similarities shift with the corpus.
+#
+# Usage: python src/eval/calibrate_gate.py --labels data/gate_labels.json
+
+LABELS_PATH = os.path.join(BASE_DIR, "data", "gate_labels.json")
+REPORT_PATH = os.path.join(OUTPUT_DIR, "gate_calibration.json")
+
+
+def load_labels(path=LABELS_PATH):
+    # [{"question": "...", "answerable": true|false}, ...]
+    with open(path, "r", encoding="utf-8") as f:
+        return [{"question": item["question"], "answerable": bool(item["answerable"])} for item in json.load(f)]
+
+
+def collect_features(labels):
+    service = get_service()
+    samples = []
+    for item in labels:
+        docs, _, _ = service.retrieve(item["question"])
+        docs = dedupe_documents(docs)
+        samples.append({**item, "features": service.gate_features(item["question"], docs)})
+    return samples
+
+
+def run_calibration(labels_path=LABELS_PATH, max_false_rejects=0):
+    samples = collect_features(load_labels(labels_path))
+    thresholds, report = calibrate(samples, max_false_rejects=max_false_rejects)
+
+    gate = ConfidenceGate(thresholds)
+    print(f"   {'label':<12} {'max_sim':>8} {'top3':>6} {'cover':>6}  gate   question")
+    for sample in samples:
+        passed, _ = gate.check(sample["features"])
+        features = sample["features"]
+        label = "answerable" if sample["answerable"] else "unanswerable"
+        print(f"   {label:<12} {features['max_sim']:>8} {features['mean_top3_sim']:>6} "
+              f"{str(features['coverage']):>6}  {'pass' if passed else 'STOP'}   {sample['question'][:60]}")
+        sample["gate_passed"] = passed
+    return thresholds, report, samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the retrieval-confidence gate on labelled questions.")
+    parser.add_argument("--labels", default=LABELS_PATH, help="JSON list of {question, answerable}.")
+    parser.add_argument("--max-false-rejects", type=int, default=0,
+                        help="Answerable questions the gate may turn away.")
+    args = parser.parse_args()
+
+    print("🚧 Calibrating the confidence gate (retrieval only, no LLM calls)...")
+    thresholds, report, samples = run_calibration(args.labels, args.max_false_rejects)
+    print(f"🎯 Thresholds: {thresholds}")
+    print(f"📊 Unanswerable stopped: {report['unanswerable_rejected']}/{report['unanswerable']}, "
+          f"answerable stopped: {report['answerable_rejected']}/{report['samples'] - report['unanswerable']}")
+
+    with open(GATE_PATH, "w") as f:
+        json.dump({"thresholds": thresholds, "calibration": report}, f, indent=2)
+    with open(REPORT_PATH, "w") as f:
+        json.dump({**report, "questions": samples}, f, indent=2)
+    print(f"✅ Gate saved: {GATE_PATH}")
+    print(f"📄 Report: {REPORT_PATH}")
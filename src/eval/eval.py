@@ -2,22 +2,27 @@ import sys
 import os
 import json
 import time
-import pandas as pd
+import random
+import asyncio
+import argparse
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(SRC_DIR, "RAG"))
+sys.path.append(os.path.join(SRC_DIR, "ingest"))
+from service import get_service
+from embed_pipeline import is_retryable, retry_after
 
 
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
-MANIFEST_PATH = os.path.join(BASE_DIR, "data", "data_manifest.csv")
+QUESTIONS_PATH = os.path.join(BASE_DIR, "data", "eval_questions.txt")
 
 
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 SUMMARY_PATH = os.path.join(OUTPUT_DIR, "evaluation_results_final3.json")
+CHECKPOINT_PATH = os.path.join(OUTPUT_DIR, "eval_checkpoint.jsonl")
 
 
 LOGS_DIR = os.path.join(BASE_DIR, "logs")
@@ -27,182 +32,136 @@ LOGS_PATH = os.path.join(LOGS_DIR, "retrieval_logs3.json")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-# --- 1. SMART CITATION MAPPING ---
-def build_citation_map(vector_store, manifest_path):
-    print("🗺️  Building citation map...")
-    filename_to_citation = {}
-    try:
-        df = pd.read_csv(manifest_path)
-        # Normalize column names
-        df.columns = [c.strip() for c in df.columns] 
-        
-        fname_col, cite_col = None, None
-        for col in df.columns:
-            if col.lower() in ['filename', 'file name', 'file', 'name']: fname_col = col
-            if col.lower() in ['citation', 'citations', 'cite']: cite_col = col
-        
-        if fname_col and cite_col:
-            for _, row in df.iterrows():
-                fname = os.path.basename(str(row[fname_col]).strip())
-                filename_to_citation[fname] = str(row[cite_col])
-    except Exception as e:
-        print(f"⚠️ Warning: Manifest error: {e}")
-
-    try:
-        data = vector_store.get()
-        id_to_citation = {}
-        for meta in data['metadatas']:
-            if not meta: continue
-            s_id = meta.get('source_id')
-            fname = meta.get('filename') or meta.get('source')
-            if s_id and fname:
-                fname = os.path.basename(fname).strip()
-                id_to_citation[s_id] = filename_to_citation.get(fname, fname)
-        print(f"✅ Mapped {len(id_to_citation)} citations.")
-        return id_to_citation
-    except Exception:
-        return {}
-
-
-vector_store = Chroma(persist_directory=DB_PATH, embedding_function=OpenAIEmbeddings())
-SOURCE_ID_TO_CITATION = build_citation_map(vector_store, MANIFEST_PATH)
-
-# --- 2. RAG SETUP ---
-retriever = vector_store.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 12, "fetch_k": 20, "lambda_mult": 0.7}
-)
-
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
-
-PROMPT_TEMPLATE = """
-You are a Research Assistant. Use ONLY the provided context to answer the question.
-
-CONTEXT:
-{context}
-
-QUESTION: 
-{question}
-
-INSTRUCTIONS:
-1. Answer clearly and concisely.
-2. If the context has no answer, say "Insufficient Evidence".
-3. Cite your sources using the [source_id] found in the context (e.g., [source_05]).
-4. If the context has multiple sources, cite the relevant ones.
-
-OUTPUT FORMAT (JSON):
-{{
-  "answer": "Your answer...",
-  "citations": ["source_01", "source_05"]
-}}
-"""
-prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+# Questions in flight at once, and how hard to retry a throttled one
+EVAL_WORKERS = 8
+MAX_RETRIES = 6
+BASE_DELAY = 2.0
+MAX_DELAY = 60.0
 
+# --- 1. RAG SERVICE ---
+# Everything (Chroma, embeddings, GPT-4o, citation map) lives in the lazily
+# built, process-wide service, so importing this module costs nothing.
 def run_query(question):
-    print(f"\n🔵 Query: {question}")
-    start_time = time.time()
-    
-    # 1. Retrieve
-    docs = retriever.invoke(question)
-    
-    # 2. Process Context & Log Chunks
-    context_text = ""
-    retrieved_chunks_log = [] 
-    
-    for doc in docs:
-        s_id = doc.metadata.get('source_id', 'Unknown')
-        content = doc.page_content
-        context_text += f"[{s_id}] {content}\n\n"
-        
-        retrieved_chunks_log.append({
-            "source_id": s_id,
-            "citation": SOURCE_ID_TO_CITATION.get(s_id, "Unknown"),
-            "text_snippet": content  
-        })
-    
-    # 3. Generate
-    chain = prompt | llm
-    try:
-        response = chain.invoke({"context": context_text, "question": question})
-        content = response.content.replace("```json", "").replace("```", "")
-        result_json = json.loads(content)
-        
-        answer = result_json.get("answer", "Error parsing answer")
-        raw_ids = result_json.get("citations", [])
-        for s_id, readable_cite in SOURCE_ID_TO_CITATION.items():
-            answer = answer.replace(f"[{s_id}]", f"({readable_cite})")
-
-
-        # Convert IDs to Real Citations
-        readable_citations = []
-        for rid in raw_ids:
-            clean_id = rid.replace("[", "").replace("]", "").strip()
-            citation = SOURCE_ID_TO_CITATION.get(clean_id, clean_id)
-            if citation not in readable_citations:
-                readable_citations.append(citation)
-
-    except Exception as e:
-        answer = f"Error: {str(e)}"
-        readable_citations = []
-        raw_ids = []
-
-    elapsed = time.time() - start_time
-    
-    # Print to Terminal
-    print(f"🟢 Answer: {answer}")
-    if readable_citations:
-        print(f"📚 Sources: {', '.join(readable_citations)}")
-    else:
-        print("📚 Sources: None")
-    print("-" * 60)
-
-
-    return {
-        "question": question,
-        "answer": answer,
-        "citations_readable": readable_citations,
-        "citations_raw": raw_ids,
-        "retrieved_chunks": retrieved_chunks_log, # <--- The requirement
-        "time_taken": round(elapsed, 2)
-    }
-
-# --- 3. THE QUESTIONS --
-questions = [
-    # Direct
-    "What specific failures does the 'AfroBench' paper identify in current LLMs?",
-    "According to Conneau (2020), how does XLM-R compare to mBERT?",
-    "What are the three main challenges in preserving cultural identity according to Anik (2025)?",
-    "How does the 'Cheetah' paper propose to handle 517 African languages?",
-    "What metrics were used to evaluate the 'NaijaSenti' corpus?",
-    "Does the 'Localising SA official languages' paper recommend manual or automated collection?",
-    "What is the 'Bitter Lesson' described by Wu et al. (2025)?",
-    "List the datasets used in the 'IrokoBench' benchmark.",
-    "What is the main contribution of the 'No Language Left Behind' project?",
-    "How does 'AfriCOMET' improve upon standard COMET metrics?",
-    
-    # Synthesis
-    "Compare the approaches of 'Masakhane' and 'NLLB' regarding community involvement.",
-    "What common biases do 'CultureVLM' and 'Global MMLU' identify in multilingual models?",
-    "Synthesize the findings on 'Code-Switching' from Terblanche (2024) and any other relevant paper.",
-    "Do 'AfroBench' and 'IrokoBench' agree on the performance of GPT-4 for African languages?",
-    "How do 'NileChat' and 'Jawaher' differ in their approach to Arabic dialects?",
-
-    # Edge Cases
-    "What does the corpus say about 'Quantum Computing in Yoruba'?", 
-    "Does the 'WAXAL' paper discuss speech synthesis for Martian languages?",
-    "Find evidence for the claim that 'LLMs are perfect translators'.",
-    "What is the specific learning rate used in the 'DeepSeek-V3' paper?",
-    "Does the corpus contain the personal email address of the author 'Adebara'?"
-]
+    # Bypass the semantic answer cache so every eval run measures the LLM
+    return get_service().run_query(question, use_cache=False)
+
+# --- 2. THE QUESTIONS --
+def load_questions(path=QUESTIONS_PATH):
+    # .txt: one question per line (# comments and blank lines skipped)
+    # .json: a list of strings, or of objects with a "question" field
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            items = json.load(f)
+            loaded = [item["question"] if isinstance(item, dict) else item for item in items]
+        else:
+            loaded = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    # Duplicates would only be answered (and checkpointed) once anyway
+    return list(dict.fromkeys(loaded))
+
+# --- 3. CHECKPOINT ---
+# One JSON line per answered question, appended and flushed as soon as the
+# answer is in, so a crash loses at most the questions still in flight. A
+# re-run skips whatever the checkpoint already holds for the current index
+# and config (answers from an older index are asked again).
+def read_checkpoint(path, version):
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue            # half-written last line from a crash
+            if record.get("version") == version:
+                done[record["question"]] = record["result"]
+    return done
+
+def append_checkpoint(f, version, result):
+    f.write(json.dumps({"version": version, "question": result["question"], "result": result}) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+# --- 4. CONCURRENT RUNNER ---
+class Backoff:
+    # Shared by all workers: once one of them is rate-limited, everyone
+    # pauses until the cool-down is over instead of piling on more 429s
+    def __init__(self):
+        self.resume_at = 0.0
+
+    async def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+async def answer_with_retry(service, question, backoff, stats):
+    attempt = 0
+    while True:
+        await backoff.wait()
+        try:
+            return await service.arun_query(question, use_cache=False, raise_errors=True)
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not is_retryable(e):
+                stats["failed"] += 1
+                print(f"❌ Giving up on '{question}': {type(e).__name__}: {e}")
+                return None
+            delay = retry_after(e)
+            if delay is None:
+                delay = min(MAX_DELAY, BASE_DELAY * (2 ** attempt)) * (0.5 + random.random())
+            attempt += 1
+            stats["retries"] += 1
+            backoff.pause(delay)
+            print(f"   ⏳ Throttled ({type(e).__name__}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+
+async def run_eval(pending, workers, checkpoint_path, version, total):
+    service = get_service()
+    semaphore = asyncio.Semaphore(workers)
+    backoff = Backoff()
+    stats = {"answered": 0, "retries": 0, "failed": 0}
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        async def worker(question):
+            async with semaphore:
+                result = await answer_with_retry(service, question, backoff, stats)
+            if result is not None:
+                append_checkpoint(checkpoint, version, result)
+                stats["answered"] += 1
+                print(f"📝 [{total - len(pending) + stats['answered']}/{total}] checkpointed")
+
+        await asyncio.gather(*(worker(q) for q in pending))
+    return stats
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the evaluation questions through the RAG service.")
+    parser.add_argument("--questions", default=QUESTIONS_PATH, help="Question file (.txt, one per line, or .json).")
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS, help="Questions answered concurrently.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Append-only JSONL of finished answers.")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and answer everything again.")
+    args = parser.parse_args()
+
     print("🚀 Starting Final Evaluation Run (MMR + Logging)...")
-    full_results = []
-    
-    for q in questions:
-        full_results.append(run_query(q))
-    
-    
+    print(f"🔥 Warm-up: {get_service().warm_up()}")
+    eval_questions = load_questions(args.questions)
+    version = get_service().index_version()
+
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    done = read_checkpoint(args.checkpoint, version)
+    pending = [q for q in eval_questions if q not in done]
+    print(f"📋 {len(eval_questions)} questions: {len(eval_questions) - len(pending)} from checkpoint, "
+          f"{len(pending)} to run with {args.workers} workers")
+
+    start = time.time()
+    stats = asyncio.run(run_eval(pending, args.workers, args.checkpoint, version, len(eval_questions)))
+    print(f"⏱️  {stats['answered']} answered in {round(time.time() - start, 1)}s "
+          f"({stats['retries']} retries, {stats['failed']} failed)")
+
+    done = read_checkpoint(args.checkpoint, version)
+    full_results = [done[q] for q in eval_questions if q in done]
+
     # 1. Summary (Clean for Report)
     summary_results = []
     for res in full_results:
@@ -212,14 +171,20 @@ if __name__ == "__main__":
             "citations": res["citations_readable"],
             "time_taken": res["time_taken"]
         })
-    
+
     with open(SUMMARY_PATH, "w") as f:
         json.dump(summary_results, f, indent=2)
-        
+
     # 2. Detailed Logs
     with open(LOGS_PATH, "w") as f:
         json.dump(full_results, f, indent=2)
 
+    print(f"\n🧊 Embedding cache: {get_service().embeddings.cache.stats()}")
+    if get_service().llm_cache:
+        print(f"🧊 LLM cache: {get_service().llm_cache.stats()}")
+    print(f"🧾 Answer parsing: {get_service().answer_parser.stats()}")
+    if stats["failed"]:
+        print(f"⚠️ {stats['failed']} questions failed; re-run to retry just those.")
     print(f"\n✅ Done! Files Saved:")
     print(f"📄 Report Data: {SUMMARY_PATH}")
-    print(f"🪵  Run Logs:   {LOGS_PATH}")
\ No newline at end of file
+    print(f"🪵  Run Logs:   {LOGS_PATH}")
@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import pickle
+import argparse
+import numpy as np
+import faiss
+import chromadb
+
+# --- CHROMA -> FAISS CONVERSION ---
+# Copies the vectors, texts and metadata that ingest.py stored in Chroma into
+# FAISS indexes (no re-embedding), so the backends can be compared on the
+# same data. Writes to data/faiss/:
+#   flat.index / ivf.index / hnsw.index   - float32 index variants
+#   int8.index / binary.index             - quantized variants (4x / 32x smaller)
+#   vectors.npy                           - float32 matrix, memory-mapped at query time
+#   docstore.pkl                          - ids, texts, metadatas by position
+#
+# Usage: python src/ingest/build_faiss.py [--kinds flat ivf hnsw int8 binary]
+# Then:  RAG_VECTOR_BACKEND=faiss-hnsw python src/eval/eval.py
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
+COLLECTION_NAME = "langchain"  # langchain_chroma's default collection
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from vector_index import FAISS_DIR, FAISS_KINDS, faiss_paths, binary_codes
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+
+
+def export_collection(db_path, collection_name, page_size=5000):
+    client = chromadb.PersistentClient(path=db_path)
+    collection = client.get_collection(collection_name)
+    ids, texts, metadatas, vectors = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas", "embeddings"],
+                              limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        ids.extend(page["ids"])
+        texts.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        vectors.append(np.asarray(page["embeddings"], dtype="float32"))
+        offset += len(page["ids"])
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype="float32")
+    return ids, texts, metadatas, matrix
+
+
+def build_index(kind, vectors):
+    n, dims = vectors.shape
+    # L2 to match Chroma's default "l2" space, so rankings are comparable
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dims)
+    elif kind == "ivf":
+        nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))  # FAISS wants ~39 points per centroid
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dims), dims, nlist)
+        index.train(vectors)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dims, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif kind == "int8":
+        index = faiss.IndexScalarQuantizer(dims, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        index.train(vectors)  # learns the per-dimension min/max ranges
+    elif kind == "binary":
+        codes = binary_codes(vectors)
+        index = faiss.IndexBinaryFlat(codes.shape[1] * 8)  # Hamming distance on sign bits
+        index.add(codes)
+        return index
+    else:
+        raise ValueError(f"Unknown index kind '{kind}'")
+    index.add(vectors)
+    return index
+
+
+def convert(db_path=DB_PATH, collection_name=COLLECTION_NAME, out_dir=FAISS_DIR, kinds=FAISS_KINDS):
+    print(f"📤 Exporting '{collection_name}' from {db_path}...")
+    ids, texts, metadatas, vectors = export_collection(db_path, collection_name)
+    if not ids:
+        print("❌ ERROR: Collection is empty. Run ingest.py first.")
+        return
+    print(f"   -> {len(ids)} vectors, {vectors.shape[1]} dims")
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = faiss_paths(out_dir, kinds[0])
+    np.save(paths["vectors"], vectors)
+    with open(paths["docstore"], "wb") as f:
+        pickle.dump({"ids": ids, "texts": texts, "metadatas": metadatas}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    for kind in kinds:
+        start = time.perf_counter()
+        index = build_index(kind, vectors)
+        write = faiss.write_index_binary if kind == "binary" else faiss.write_index
+        write(index, faiss_paths(out_dir, kind)["index"])
+        size_mb = os.path.getsize(faiss_paths(out_dir, kind)["index"]) / 1e6
+        print(f"   ✅ {kind:<6} built in {time.perf_counter() - start:.2f}s ({size_mb:.1f} MB)")
+
+    print(f"🚀 FAISS indexes written to {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the Chroma collection into FAISS indexes.")
+    parser.add_argument("--db-path", default=DB_PATH)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--out", default=FAISS_DIR)
+    parser.add_argument("--kinds", nargs="+", default=list(FAISS_KINDS), choices=FAISS_KINDS)
+    args = parser.parse_args()
+    convert(args.db_path, args.collection, args.out, tuple(args.kinds))
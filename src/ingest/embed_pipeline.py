@@ -0,0 +1,109 @@
+import time
+import random
+import asyncio
+from collections import deque
+
+# --- ASYNC, RATE-LIMITED EMBEDDING PRIMITIVES ---
+# Building blocks for the embed stage of stream_ingest.py:
+#   * a sliding-window limiter keeps us under the RPM / TPM budget
+#   * 429s / 5xx / timeouts are retried with exponential backoff + jitter
+#   * chunk ids are deterministic, so committed_ids() lets a re-run skip what
+#     a previous (interrupted) run already upserted
+#
+# To exercise it without an API key, start fake_embedding_server.py and point
+# the OpenAI client at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+def estimate_tokens(text):
+    # ~4 characters per token for English; cheap enough to run on every chunk
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    # Sliding 60-second window over both request count and token count
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.window = window
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    async def acquire(self, tokens):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                requests_ok = self.rpm is None or len(self._events) < self.rpm
+                # A single batch bigger than the whole budget is let through on an empty window
+                tokens_ok = (self.tpm is None or not self._events
+                             or self._tokens_in_window + tokens <= self.tpm)
+                if requests_ok and tokens_ok:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                await asyncio.sleep(max(0.05, self.window - (now - self._events[0][0])))
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    if name in ("RateLimitError", "APITimeoutError", "APIConnectionError",
+                "TimeoutError", "ConnectionError", "ReadTimeout"):
+        return True
+    return "rate limit" in str(exc).lower()
+
+
+def retry_after(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def committed_ids(collection, ids, lookup_size=500):
+    # Which of these ids are already stored? (the store itself is our checkpoint)
+    found = set()
+    for i in range(0, len(ids), lookup_size):
+        found.update(collection.get(ids=ids[i:i + lookup_size], include=[])["ids"])
+    return found
+
+
+def refresh_metadata(collection, ids, metadatas, batch_size=500):
+    # Rewrite the metadata of stored chunks without re-embedding them
+    for i in range(0, len(ids), batch_size):
+        collection.update(ids=ids[i:i + batch_size], metadatas=metadatas[i:i + batch_size])
+
+
+async def embed_with_retry(texts, tokens, embeddings, limiter,
+                           max_retries=6, base_delay=1.0, max_delay=60.0, stats=None):
+    attempt = 0
+    while True:
+        await limiter.acquire(tokens)
+        try:
+            return await embeddings.aembed_documents(texts)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = retry_after(e)
+            if delay is None:
+                delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random())
+            attempt += 1
+            if stats is not None:
+                stats["retries"] += 1
+            print(f"      ⏳ Embedding batch throttled ({type(e).__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,85 @@
+import json
+import random
+import hashlib
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- FAKE OPENAI EMBEDDING SERVER ---
+# Local stand-in for POST /v1/embeddings so the ingestion pipeline can be run
+# end to end without an API key or spend. Vectors are deterministic (hash of
+# the input), and --fail-rate injects 429s to exercise the backoff path.
+#
+#   python src/ingest/fake_embedding_server.py --port 8765 --fail-rate 0.2
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python src/ingest/ingest.py
+
+def fake_vector(item, dims):
+    # OpenAIEmbeddings may send raw strings or pre-tokenised int lists
+    key = item if isinstance(item, str) else json.dumps(item)
+    seed = hashlib.sha256(key.encode("utf-8")).digest()
+    rng = random.Random(seed)
+    vec = [rng.uniform(-1.0, 1.0) for _ in range(dims)]
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+def make_handler(dims, fail_rate):
+    class EmbeddingHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/embeddings"):
+                self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+
+            if random.random() < fail_rate:
+                self._send(429, {"error": {"message": "Rate limit reached (fake)", "type": "requests"}},
+                           headers={"retry-after": "0.2"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            inputs = request.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+
+            data = [
+                {"object": "embedding", "index": i, "embedding": fake_vector(item, dims)}
+                for i, item in enumerate(inputs)
+            ]
+            tokens = sum(len(item) if isinstance(item, list) else len(item) // 4 for item in inputs)
+            self._send(200, {
+                "object": "list",
+                "data": data,
+                "model": request.get("model", "fake-embedding"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def log_message(self, fmt, *args):
+            print(f"   [fake-embeddings] {fmt % args}")
+
+    return EmbeddingHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve deterministic fake OpenAI embeddings.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with HTTP 429.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.dims, args.fail_rate))
+    print(f"🧪 Fake embedding server on http://127.0.0.1:{args.port}/v1 ({args.dims} dims, "
+          f"{args.fail_rate:.0%} 429s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,11 +1,28 @@
 import os
+import sys
+import time
+import hashlib
+import argparse
 import pandas as pd
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 
+from ingest_state import (
+    file_sha256, manifest_row_to_dict, load_state, save_state,
+    plan_changes, chunk_ids, delete_chunks,
+)
+from stream_ingest import StreamingIngestPipeline
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RAG"))
+from embedding_cache import CachedEmbeddings
+from dedupe import dedupe_chunks, strip_boilerplate
+from citations import write_citation_table
+from hybrid import build_bm25_index, load_bm25_index, BM25_PATH
+from query_expansion import build_expansion_vocab, EXPANSION_PATH
+from parents import ParentStore, parent_ids
+
 load_dotenv()
 
 # Paths
@@ -13,8 +30,62 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 DATA_PATH = os.path.join(BASE_DIR, "data", "raw")
 MANIFEST_PATH = os.path.join(BASE_DIR, "data", "data_manifest.csv")
 DB_PATH = os.path.join(BASE_DIR, "data", "chroma_db")
+STATE_PATH = os.path.join(BASE_DIR, "data", "ingest_state.json")
+CITATIONS_PATH = os.path.join(BASE_DIR, "data", "citations.json")
+
+# Embedding budget (tune to your OpenAI tier)
+EMBED_BATCH_SIZE = 64
+EMBED_CONCURRENCY = 4
+EMBED_RPM = 3000
+EMBED_TPM = 1_000_000
+
+# Chunking. --small-to-big embeds smaller child chunks; either way every chunk
+# points at its page in the parent store (data/parents.sqlite)
+CHUNK_SIZE, CHUNK_OVERLAP = 1000, 200
+CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP = 400, 50
+DEFAULT_CHUNKING = f"{CHUNK_SIZE}/{CHUNK_OVERLAP}"
+
+def pdf_job(s_id, row):
+    # Manifest metadata is attached to every single page inside the worker
+    metadata = {
+        'source_id': row['source_id'],
+        'citation': row['citation'], # e.g. "(Smith, 2023)"
+        'title': row['title'],
+        'filename': row['filename'],
+    }
+    return s_id, os.path.join(DATA_PATH, row['filename']), metadata
+
+def make_embeddings():
+    # Retries are owned by embed_pipeline so they respect our rate budget;
+    # the disk cache means unchanged chunk text is never paid for twice
+    return CachedEmbeddings(OpenAIEmbeddings(max_retries=0))
+
+def version_key(entry):
+    # Chunk / page ids change with the file AND with the chunking, so a
+    # re-chunk never "resumes" onto chunks cut the old way
+    if entry["chunking"] == DEFAULT_CHUNKING:
+        return entry["sha256"]
+    return hashlib.sha256(f"{entry['sha256']}|{entry['chunking']}".encode()).hexdigest()
 
-def ingest_data():
+# Manifest fields copied onto every chunk; what Chroma holds must match the manifest
+CHUNK_MANIFEST_FIELDS = ('source_id', 'citation', 'title', 'filename')
+
+def stale_metadata(vector_store, current, s_ids):
+    # Papers whose stored chunks disagree with their manifest row. Run after
+    # ingest: BM25, citations.json and FAISS are all rebuilt from this metadata
+    stale = {}
+    for s_id in s_ids:
+        stored = vector_store.get(where={'source_id': s_id}, include=["metadatas"])["metadatas"]
+        expected = {field: current[s_id]["manifest"][field] for field in CHUNK_MANIFEST_FIELDS}
+        wrong = sorted({field for metadata in stored for field in CHUNK_MANIFEST_FIELDS
+                        if str(metadata.get(field)) != expected[field]})
+        if wrong:
+            stale[s_id] = wrong
+    return stale
+
+def ingest_data(full_rebuild=False, workers=None, batch_size=EMBED_BATCH_SIZE,
+                concurrency=EMBED_CONCURRENCY, rpm=EMBED_RPM, tpm=EMBED_TPM, dedupe=True,
+                small_to_big=False):
     print("Loading Data Manifest...")
     try:
         manifest = pd.read_csv(MANIFEST_PATH)
@@ -22,52 +93,166 @@ def ingest_data():
         print("❌ Error: data_manifest.csv not found.")
         return
 
-    documents = []
+    vector_store = Chroma(persist_directory=DB_PATH, embedding_function=make_embeddings())
+
+    if full_rebuild:
+        print("🗑️  Full rebuild requested. Dropping existing collection...")
+        vector_store.delete_collection()
+        vector_store = Chroma(persist_directory=DB_PATH, embedding_function=make_embeddings())
+        state = {}
+    else:
+        state = load_state(STATE_PATH)
+        for entry in state.values():
+            entry.setdefault("chunking", DEFAULT_CHUNKING)  # state written before chunking was recorded
+    parent_store = ParentStore()
+    if full_rebuild:
+        parent_store.clear()
 
-    print(f"Found {len(manifest)} papers. Starting ingestion...")
-    
+    chunk_size, chunk_overlap = (CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP) if small_to_big else (CHUNK_SIZE, CHUNK_OVERLAP)
+    chunking = f"{chunk_size}/{chunk_overlap}"
+    if dedupe:
+        # Stripped pages chunk differently, so this is part of the chunk ids
+        chunking += "|strip_boilerplate"
+
+    # 1. Fingerprint every PDF that is in the manifest and on disk
+    print(f"Found {len(manifest)} papers. Checking for changes...")
+    current = {}
+    rows = {}
     for index, row in manifest.iterrows():
         file_path = os.path.join(DATA_PATH, row['filename'])
-        
+
         if not os.path.exists(file_path):
             print(f"⚠️ Warning: File {row['filename']} not found. Skipping.")
             continue
 
-        try:
-            # Load PDF
-            loader = PyPDFLoader(file_path)
-            docs = loader.load()
-            
-            # Attach Metadata from Manifest to every single page
-            for doc in docs:
-                doc.metadata['source_id'] = row['source_id']
-                doc.metadata['citation'] = row['citation'] # e.g. "(Smith, 2023)"
-                doc.metadata['title'] = row['title']
-            
-            documents.extend(docs)
-            print(f"   ✅ Loaded {row['filename']}")
-            
-        except Exception as e:
-            print(f"   ❌ Failed to load {row['filename']}: {e}")
+        current[row['source_id']] = {
+            "filename": row['filename'],
+            "sha256": file_sha256(file_path),
+            "manifest": manifest_row_to_dict(row),
+            "chunking": chunking,
+        }
+        rows[row['source_id']] = row
+
+    added, changed, removed = plan_changes(state, current)
+    print(f"   ➕ {len(added)} new   ✏️  {len(changed)} changed   ➖ {len(removed)} removed   "
+          f"✅ {len(current) - len(added) - len(changed)} unchanged")
+
+    # 2. Drop chunks for papers that left the manifest (or whose PDF disappeared)
+    for s_id in removed:
+        deleted = delete_chunks(vector_store, "source_id", s_id)
+        parent_store.delete_source(s_id)
+        state.pop(s_id, None)
+        save_state(STATE_PATH, state)
+        print(f"   🗑️  Removed {s_id} ({deleted} chunks)")
 
     # 3. Chunking (Splitting text into pieces)
     # We use a 1000 character chunk with 200 overlap to keep context
-    print("✂️  Chunking text...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = text_splitter.split_documents(documents)
-    print(f"   Created {len(chunks)} text chunks.")
-
-    # 4. Embed & Save to Vector DB
-    print("💾 Saving to Vector Database (this may take a minute)...")
-    
-    # We use ChromaDB (local file) and OpenAI Embeddings
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=OpenAIEmbeddings(),
-        persist_directory=DB_PATH
+    # (400 / 50 child chunks with --small-to-big; the page supplies the context)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    # 4. Stream new / edited papers through parse -> chunk -> embed -> upsert.
+    #    State is committed per paper as soon as its last chunk lands, so an
+    #    interrupted run resumes cleanly.
+    failed = []
+    boilerplate = {"lines": 0, "chars": 0, "total_chars": 0}
+
+    def on_file_parsed(s_id, pages):
+        # Repeated headers/footers go before anything is chunked or stored
+        if dedupe:
+            boilerplate["total_chars"] += sum(len(page.page_content) for page in pages)
+            lines, chars = strip_boilerplate(pages)
+            boilerplate["lines"] += lines
+            boilerplate["chars"] += chars
+        # Each page is stored once as the parent of the chunks cut from it
+        pids = parent_ids(s_id, version_key(current[s_id]), len(pages))
+        for pid, page in zip(pids, pages):
+            page.metadata['parent_id'] = pid
+        parent_store.replace_source(s_id, ((pid, page.page_content, page.metadata) for pid, page in zip(pids, pages)))
+
+    def on_file_start(s_id, ids):
+        # Stale chunks from an older version (or a pre-incremental build) go first;
+        # ids of this exact version are kept so an interrupted run can resume
+        delete_chunks(vector_store, "source_id", s_id, keep_ids=set(ids))
+
+    def on_file_done(s_id):
+        state[s_id] = current[s_id]
+        save_state(STATE_PATH, state)
+        print(f"   ✅ Loaded {rows[s_id]['filename']}")
+
+    def on_file_failed(s_id, error):
+        print(f"   ❌ Failed to load {rows[s_id]['filename']}: {error}")
+        failed.append(rows[s_id]['filename'])
+
+    pipeline = StreamingIngestPipeline(
+        vector_store, text_splitter,
+        id_fn=lambda s_id, n: chunk_ids(s_id, version_key(current[s_id]), n),
+        workers=workers, batch_size=batch_size, concurrency=concurrency,
+        requests_per_minute=rpm, tokens_per_minute=tpm,
+        # Chunks that are near-identical as a whole (duplicated pages or tables)
+        # are dropped before embedding, scoped per paper so incremental
+        # re-ingest stays exact. Boilerplate inside chunks is stripped above.
+        chunk_filter=dedupe_chunks if dedupe else None,
+        on_file_parsed=on_file_parsed, on_file_start=on_file_start,
+        on_file_done=on_file_done, on_file_failed=on_file_failed,
     )
-    
-    print(f"🚀 Success! Database created at {DB_PATH}")
+    print(f"💾 Streaming {len(added) + len(changed)} papers into the Vector Database "
+          f"(batch={batch_size}, concurrency={concurrency})...")
+    stats = pipeline.run(pdf_job(s_id, rows[s_id]) for s_id in added + changed)
+    total_chunks = pipeline.counters["upsert"].items
+
+    print(f"   -> {stats['files']} papers committed, {stats['skipped']} chunks already committed (metadata refreshed), "
+          f"{stats['deduped']} near-duplicates dropped, {stats['retries']} retries in {stats['seconds']}s")
+    if dedupe:
+        share = boilerplate["chars"] / boilerplate["total_chars"] if boilerplate["total_chars"] else 0.0
+        print(f"   ✂️  Stripped {boilerplate['lines']} header/footer lines ({share:.1%} of page text)")
+    print(pipeline.report())
+    print(f"   🧊 Embedding cache: {vector_store.embeddings.cache.stats()}")
+
+    # Every re-ingested paper's chunks must carry its current manifest row
+    # (a citation-only edit keeps the chunk ids, so this is the path most
+    # likely to go stale)
+    stale = stale_metadata(vector_store, current, [s_id for s_id in added + changed if s_id in state])
+    for s_id, fields in stale.items():
+        print(f"   ⚠️ {s_id}: stored chunk metadata ({', '.join(fields)}) does not match the manifest")
+
+    # 5. Lexical index over exactly what's in Chroma (rebuilt only when something changed)
+    bm25_index = None
+    if added or changed or removed or not os.path.exists(BM25_PATH):
+        start = time.perf_counter()
+        bm25_index = build_bm25_index(vector_store, BM25_PATH)
+        print(f"   🔤 Built BM25 index over {len(bm25_index)} chunks in {time.perf_counter() - start:.1f}s")
+
+    # Co-occurrence vocabulary for local query expansion, over the same chunks
+    if bm25_index is not None or not os.path.exists(EXPANSION_PATH):
+        bm25_index = bm25_index or load_bm25_index(BM25_PATH)
+        if bm25_index:
+            start = time.perf_counter()
+            vocab = build_expansion_vocab(bm25_index, EXPANSION_PATH)
+            print(f"   🔗 Built expansion vocabulary ({len(vocab['neighbours'])} terms) "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+    # 6. Citation sidecar: one row per indexed paper, so readers never scan chunks
+    table = write_citation_table(CITATIONS_PATH, (entry["manifest"] for entry in state.values()))
+    print(f"   🗺️  Wrote {len(table)} citations to {CITATIONS_PATH}")
+
+    if failed:
+        print(f"⚠️ {len(failed)} file(s) failed and will be retried next run: {', '.join(failed)}")
+    print(f"🚀 Success! Embedded {total_chunks} new chunks. Database at {DB_PATH}")
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest PDFs from data/raw into ChromaDB.")
+    parser.add_argument("--full", action="store_true",
+                        help="Drop the collection and re-embed every paper from scratch.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="PDF parsing processes (default: one per CPU, 1 = no pool).")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per embedding request.")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY, help="Embedding requests in flight.")
+    parser.add_argument("--rpm", type=int, default=EMBED_RPM, help="Embedding requests-per-minute budget.")
+    parser.add_argument("--tpm", type=int, default=EMBED_TPM, help="Embedding tokens-per-minute budget.")
+    parser.add_argument("--no-dedupe", action="store_true", help="Keep near-duplicate chunks and repeated header/footer lines.")
+    parser.add_argument("--small-to-big", action="store_true",
+                        help=f"Embed {CHILD_CHUNK_SIZE}-char child chunks; queries expand hits to their page.")
+    args = parser.parse_args()
+    ingest_data(full_rebuild=args.full, workers=args.workers, batch_size=args.batch_size,
+                concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm, dedupe=not args.no_dedupe,
+                small_to_big=args.small_to_big)
@@ -0,0 +1,55 @@
+import os
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders import PyPDFLoader
+
+# --- PARALLEL PDF PARSING ---
+# PDF parsing is CPU-bound, so we spread files across worker processes.
+# Each job is (key, file_path, metadata); the worker attaches the manifest
+# metadata to every page so the parent only has to collect results.
+
+def _load_one(job):
+    # Runs inside a worker process. Never raises: a bad PDF must not
+    # take the rest of the batch down with it.
+    key, file_path, metadata = job
+    try:
+        docs = PyPDFLoader(file_path).load()
+        for doc in docs:
+            doc.metadata.update(metadata)
+        return key, docs, None
+    except Exception as e:
+        return key, [], f"{type(e).__name__}: {e}"
+
+
+def load_pdfs_parallel(jobs, max_workers=None, max_in_flight=None):
+    # Yields (key, docs, error) in the same order as `jobs`, whatever order
+    # the workers finish in. error is None on success. `jobs` may be a lazy
+    # iterable; at most `max_in_flight` parsed files are held at once, so a
+    # slow consumer never lets finished PDFs pile up in memory.
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers <= 1:
+        # Inline path: no pool start-up cost, and easier to debug
+        for job in jobs:
+            yield _load_one(job)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = max_workers * 2
+
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        window = deque((job[0], executor.submit(_load_one, job)) for job in islice(jobs, max_in_flight))
+        while window:
+            key, future = window.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                # e.g. the result could not be sent back from the worker
+                result = (key, [], f"{type(e).__name__}: {e}")
+            # Refill the window before handing the result over
+            for job in islice(jobs, 1):
+                window.append((job[0], executor.submit(_load_one, job)))
+            yield result
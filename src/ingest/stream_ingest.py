@@ -0,0 +1,228 @@
+import time
+import asyncio
+
+from pdf_loader import load_pdfs_parallel
+from embed_pipeline import RateLimiter, estimate_tokens, committed_ids, refresh_metadata, embed_with_retry
+
+# --- STREAMING INGESTION PIPELINE ---
+# parse PDFs -> chunk pages -> embed batches -> upsert, with a bounded queue
+# between every stage. Nothing ever holds the whole corpus: at most a few
+# parsed files, `chunk_queue_size` chunks and `concurrency` batches are alive
+# at once, so memory stays flat whether we ingest 30 papers or 30,000.
+#
+#   parse  --(file_queue)-->  chunk  --(chunk_queue)-->  embed + upsert
+#
+# A file is reported done (on_file_done) only after every one of its chunks
+# has been upserted, so the caller can commit ingest state file by file.
+
+_END = object()
+
+
+class StageCounter:
+    # Per-stage throughput: items processed and time spent busy
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0
+
+    def add(self, items, seconds):
+        self.items += items
+        self.busy += seconds
+
+    def summary(self, wall):
+        rate = self.items / wall if wall > 0 else 0.0
+        return f"{self.name:<7} {self.items:>7} {self.unit:<7} busy {self.busy:7.1f}s   {rate:8.1f} {self.unit}/s"
+
+
+class StreamingIngestPipeline:
+    def __init__(self, vector_store, text_splitter, id_fn,
+                 workers=None, batch_size=64, max_batch_tokens=8000, concurrency=4,
+                 requests_per_minute=None, tokens_per_minute=None, max_retries=6,
+                 file_queue_size=2, chunk_queue_size=None, chunk_filter=None,
+                 on_file_parsed=None, on_file_start=None, on_file_done=None, on_file_failed=None):
+        self.vector_store = vector_store
+        self.collection = vector_store._collection
+        self.embeddings = vector_store.embeddings
+        self.text_splitter = text_splitter
+        self.id_fn = id_fn                      # (key, n_chunks) -> list of chunk ids
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.limiter_args = (requests_per_minute, tokens_per_minute)
+        self.file_queue_size = file_queue_size
+        self.chunk_queue_size = chunk_queue_size or batch_size * concurrency * 2
+        self.chunk_filter = chunk_filter        # chunks -> (kept_indices, dropped), e.g. dedupe_chunks
+        self.on_file_parsed = on_file_parsed    # (key, pages) called before splitting; may tag page metadata
+        self.on_file_start = on_file_start      # (key, ids) called before a file's chunks are queued
+        self.on_file_done = on_file_done or (lambda key: None)
+        self.on_file_failed = on_file_failed or (lambda key, error: None)
+
+        self.counters = {
+            "parse": StageCounter("parse", "pages"),
+            "chunk": StageCounter("chunk", "chunks"),
+            "embed": StageCounter("embed", "chunks"),
+            "upsert": StageCounter("upsert", "chunks"),
+        }
+        self.stats = {"files": 0, "skipped": 0, "deduped": 0, "retries": 0, "failed_files": 0, "seconds": 0.0}
+
+        # Per-file bookkeeping for completion tracking
+        self._expected = {}
+        self._committed = {}
+        self._failed = set()
+
+    # --- Stage 1: parse (process pool, driven from a thread) ---
+    async def _parse_stage(self, jobs, file_queue):
+        parsed = load_pdfs_parallel(jobs, max_workers=self.workers)
+        while True:
+            start = time.perf_counter()
+            item = await asyncio.to_thread(next, parsed, _END)
+            if item is _END:
+                break
+            key, docs, error = item
+            self.counters["parse"].add(len(docs), time.perf_counter() - start)
+            await file_queue.put(item)
+        await file_queue.put(_END)
+
+    # --- Stage 2: chunk ---
+    async def _chunk_stage(self, file_queue, chunk_queue):
+        while True:
+            item = await file_queue.get()
+            if item is _END:
+                break
+            key, docs, error = item
+            if error:
+                self._fail(key, error)
+                continue
+
+            start = time.perf_counter()
+            if self.on_file_parsed:
+                await asyncio.to_thread(self.on_file_parsed, key, docs)
+            chunks = await asyncio.to_thread(self.text_splitter.split_documents, docs)
+            del docs
+            ids = self.id_fn(key, len(chunks))
+            if self.chunk_filter:
+                # Ids come from the unfiltered positions so they stay stable across runs
+                kept, dropped = await asyncio.to_thread(self.chunk_filter, chunks)
+                chunks = [chunks[i] for i in kept]
+                ids = [ids[i] for i in kept]
+                self.stats["deduped"] += dropped
+            if self.on_file_start:
+                await asyncio.to_thread(self.on_file_start, key, ids)
+
+            # Resume: chunks a previous run already upserted count as committed.
+            # Their ids pin the file version and chunking, so text and vector
+            # are current, but the manifest row (citation, title) may have been
+            # edited since: their metadata is rewritten from this run's pages
+            done = await asyncio.to_thread(committed_ids, self.collection, ids)
+            if done:
+                kept = [(chunk_id, chunk.metadata) for chunk_id, chunk in zip(ids, chunks) if chunk_id in done]
+                await asyncio.to_thread(refresh_metadata, self.collection,
+                                        [chunk_id for chunk_id, _ in kept], [metadata for _, metadata in kept])
+            self.stats["skipped"] += len(done)
+            self._expected[key] = len(chunks)
+            self._committed[key] = len(done)
+            self.counters["chunk"].add(len(chunks), time.perf_counter() - start)
+
+            for chunk_id, chunk in zip(ids, chunks):
+                if chunk_id not in done:
+                    await chunk_queue.put((key, chunk_id, chunk))
+            self._check_done(key)
+        await chunk_queue.put(_END)
+
+    # --- Stage 3: embed + upsert ---
+    async def _embed_stage(self, chunk_queue):
+        limiter = RateLimiter(*self.limiter_args)
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        async def run(batch, tokens):
+            try:
+                texts = [chunk.page_content for _, _, chunk in batch]
+                start = time.perf_counter()
+                try:
+                    vectors = await embed_with_retry(texts, tokens, self.embeddings, limiter,
+                                                     max_retries=self.max_retries, stats=self.stats)
+                except Exception as e:
+                    for key in {key for key, _, _ in batch}:
+                        self._fail(key, f"embedding failed: {e}")
+                    return
+                self.counters["embed"].add(len(batch), time.perf_counter() - start)
+
+                # Commit immediately; Chroma's client is synchronous so this
+                # also serialises writes on the event loop
+                start = time.perf_counter()
+                self.collection.upsert(
+                    ids=[chunk_id for _, chunk_id, _ in batch],
+                    embeddings=vectors,
+                    documents=texts,
+                    metadatas=[chunk.metadata for _, _, chunk in batch],
+                )
+                self.counters["upsert"].add(len(batch), time.perf_counter() - start)
+
+                for key, _, _ in batch:
+                    self._committed[key] += 1
+                for key in {key for key, _, _ in batch}:
+                    self._check_done(key)
+            finally:
+                slots.release()
+
+        async def launch(batch, tokens):
+            await slots.acquire()
+            task = asyncio.create_task(run(batch, tokens))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        batch, batch_tokens = [], 0
+        while True:
+            item = await chunk_queue.get()
+            if item is _END:
+                break
+            tokens = estimate_tokens(item[2].page_content)
+            if batch and (len(batch) >= self.batch_size or
+                          batch_tokens + tokens > self.max_batch_tokens):
+                await launch(batch, batch_tokens)
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += tokens
+        if batch:
+            await launch(batch, batch_tokens)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    def _fail(self, key, error):
+        if key not in self._failed:
+            self._failed.add(key)
+            self.stats["failed_files"] += 1
+            self.on_file_failed(key, error)
+
+    def _check_done(self, key):
+        if key in self._failed or key not in self._expected:
+            return
+        if self._committed[key] >= self._expected[key]:
+            self.stats["files"] += 1
+            del self._expected[key]
+            del self._committed[key]
+            self.on_file_done(key)
+
+    async def arun(self, jobs):
+        start = time.perf_counter()
+        file_queue = asyncio.Queue(maxsize=self.file_queue_size)
+        chunk_queue = asyncio.Queue(maxsize=self.chunk_queue_size)
+        await asyncio.gather(
+            self._parse_stage(jobs, file_queue),
+            self._chunk_stage(file_queue, chunk_queue),
+            self._embed_stage(chunk_queue),
+        )
+        self.stats["seconds"] = round(time.perf_counter() - start, 2)
+        return self.stats
+
+    def run(self, jobs):
+        return asyncio.run(self.arun(jobs))
+
+    def report(self):
+        wall = self.stats["seconds"]
+        lines = [counter.summary(wall) for counter in self.counters.values()]
+        return "\n".join(f"      {line}" for line in lines)